@@ -0,0 +1,79 @@
+"""Micro-benchmark of cont(), the GEDCOM line wrapping
+
+Compares cont() with the previous implementation, which encoded the rest of
+the line and ran a regex at every candidate split index, and checks that
+both return the same text.
+
+    python benchmarks/cont.py
+"""
+
+# global imports
+import os
+import re
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# local imports
+from getmyancestors.classes.tree import cont  # noqa: E402
+
+
+def previous_cont(string):
+    """cont() before the short line fast path and the byte offsets"""
+    level = int(string[:1]) + 1
+    lines = string.splitlines()
+    res = list()
+    max_len = 255
+    for line in lines:
+        c_line = line
+        to_conc = list()
+        while len(c_line.encode("utf-8")) > max_len:
+            index = min(max_len, len(c_line) - 2)
+            while (
+                len(c_line[:index].encode("utf-8")) > max_len
+                or re.search(r"[ \t\v]", c_line[index - 1 : index + 1])
+            ) and index > 1:
+                index -= 1
+            to_conc.append(c_line[:index])
+            c_line = c_line[index:]
+            max_len = 248
+        to_conc.append(c_line)
+        res.append(("\n%s CONC " % level).join(to_conc))
+        max_len = 248
+    return ("\n%s CONT " % level).join(res) + "\n"
+
+
+# name, GEDCOM line, number of calls
+CASES = (
+    ("short DATE line", "2 DATE 12 JAN 1850", 200000),
+    ("255 chars ASCII", "1 NOTE " + "x" * 248, 100000),
+    ("multi-line note", "0 @N1@ NOTE " + "line of a note\n" * 20, 20000),
+    (
+        "170 KB ASCII note",
+        "0 @N1@ NOTE " + " ".join("word%d" % i for i in range(20000)),
+        5,
+    ),
+    (
+        "230 KB UTF-8 note",
+        "0 @N1@ NOTE " + " ".join("mot€é%d" % i for i in range(20000)),
+        5,
+    ),
+)
+
+
+def main():
+    print("%-20s %12s %12s %8s" % ("case", "previous", "cont", "speedup"))
+    for name, line, number in CASES:
+        if previous_cont(line) != cont(line):
+            sys.exit("%s: different output" % name)
+        old = min(timeit.repeat(lambda: previous_cont(line), number=number, repeat=3))
+        new = min(timeit.repeat(lambda: cont(line), number=number, repeat=3))
+        print(
+            "%-20s %10.1fus %10.1fus %7.1fx"
+            % (name, old / number * 1e6, new / number * 1e6, old / new)
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+"""Parsing benchmark of GEDCOM files, in MB/s
+
+Parses a generated export, or the GEDCOM files given as arguments, with the
+Gedcom class used by mergemyancestors, and reads their lines and records
+with read_lines, tokenize and read_records. With --conc, the generated
+export is made of a few notes and facts of thousands of CONC and CONT
+continuation lines each instead.
+
+    python benchmarks/gedcom.py [-n <individuals>] [file.ged ...]
+    python benchmarks/gedcom.py --conc <lines>
+"""
+
+# global imports
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# local imports
+from getmyancestors.classes.tree import Tree, cont  # noqa: E402
+from getmyancestors.classes.gedcom import (  # noqa: E402
+    Gedcom,
+    read_lines,
+    read_records,
+    tokenize,
+)
+
+
+def words(rand, count):
+    """return count random words"""
+    return " ".join(
+        "".join(rand.choice("abcdefghijklmnopqrstuvwxyzéü") for _ in range(8))
+        for _ in range(count)
+    )
+
+
+def generate(file, individuals, seed=1):
+    """write a GEDCOM export of individuals in couples with a child, with
+    names, facts, notes and sources"""
+    rand = random.Random(seed)
+    individuals -= individuals % 3
+    file.write("0 HEAD\n1 CHAR UTF-8\n0 @SUBM@ SUBM\n1 NAME benchmark\n")
+    for i in range(1, individuals + 1):
+        file.write("0 @I%s@ INDI\n" % i)
+        file.write(
+            "1 NAME %s /%s/\n2 NOTE @N%s@\n" % (words(rand, 2), words(rand, 1), i)
+        )
+        file.write("1 SEX %s\n" % "MF"[i % 2])
+        for tag in ("BIRT", "DEAT"):
+            file.write("1 %s\n2 DATE %s\n" % (tag, rand.randint(1700, 1950)))
+            file.write("2 PLAC %s\n3 MAP\n4 LATI 48.8\n4 LONG 2.3\n" % words(rand, 3))
+        file.write("1 OCCU %s\n" % words(rand, 2))
+        file.write("1 FAM%s @F%s@\n" % ("S" if i % 3 else "C", (i + 2) // 3))
+        file.write("1 _FSFTID P%06d\n" % i)
+        file.write("1 SOUR @S%s@\n2 PAGE %s\n" % (i % 100 + 1, words(rand, 3)))
+    for i in range(1, individuals // 3 + 1):
+        file.write("0 @F%s@ FAM\n" % i)
+        file.write("1 HUSB @I%s@\n1 WIFE @I%s@\n" % (3 * i - 2, 3 * i - 1))
+        file.write("1 CHIL @I%s@\n1 MARR\n2 DATE 1800\n" % (3 * i))
+        file.write("1 _FSFTID F%06d\n" % i)
+    for i in range(1, 101):
+        file.write("0 @S%s@ SOUR \n1 TITL %s\n" % (i, words(rand, 4)))
+        file.write(cont("1 AUTH " + words(rand, 60)))
+        file.write("1 REFN S%06d\n" % i)
+    for i in range(1, individuals + 1):
+        text = "\n".join(words(rand, rand.randint(1, 20)) for _ in range(3))
+        file.write(cont("0 @N%s@ NOTE %s" % (i, text)))
+    file.write("0 TRLR\n")
+
+
+def generate_conc(file, lines, notes=20, seed=1):
+    """write a GEDCOM export of individuals with a note and a fact of about
+    lines continuation lines each"""
+    rand = random.Random(seed)
+    pool = words(rand, 1000).split()
+    file.write("0 HEAD\n1 CHAR UTF-8\n0 @SUBM@ SUBM\n1 NAME benchmark\n")
+    for i in range(1, notes + 1):
+        text = " ".join(rand.choice(pool) for _ in range(27 * lines))
+        file.write("0 @I%s@ INDI\n1 NAME %s /%s/\n" % (i, pool[i], pool[-i]))
+        file.write("1 EVEN\n2 TYPE benchmark\n")
+        file.write(cont("2 NOTE Description: " + text))
+        file.write("1 NOTE @N%s@\n" % i)
+        file.write("1 _FSFTID P%06d\n" % i)
+    for i in range(1, notes + 1):
+        text = "\n".join(
+            " ".join(rand.choice(pool) for _ in range(270)) for _ in range(lines // 10)
+        )
+        file.write(cont("0 @N%s@ NOTE %s" % (i, text)))
+    file.write("0 TRLR\n")
+
+
+def measure(name, func):
+    """run func on the file, print the time and the MB/s"""
+    size = os.path.getsize(name)
+    start = time.perf_counter()
+    with open(name, encoding="utf-8") as file:
+        func(file)
+    elapsed = time.perf_counter() - start
+    print(
+        "  %-14s %7.2f s %7.1f MB/s"
+        % (func.__name__, elapsed, size / 1e6 / max(elapsed, 1e-9))
+    )
+
+
+def gedcom(file):
+    """parse the file into a Tree, like mergemyancestors"""
+    Gedcom(file, Tree())
+
+
+def lines(file):
+    """split the lines of the file into tokens"""
+    for line in read_lines(file):
+        tokenize(line)
+
+
+def records(file):
+    """group the lines of the file into records and their children"""
+    for record in read_records(file):
+        record.children()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("files", nargs="*", help="GEDCOM files [generated]")
+    parser.add_argument(
+        "-n",
+        type=int,
+        default=50000,
+        help="individuals of the generated export [50000]",
+    )
+    parser.add_argument(
+        "--conc",
+        metavar="<lines>",
+        type=int,
+        help="generate notes and facts of <lines> continuation lines instead",
+    )
+    args = parser.parse_args()
+    names = args.files
+    generated = None
+    if not names:
+        generated = tempfile.NamedTemporaryFile(
+            "w", encoding="utf-8", suffix=".ged", delete=False
+        )
+        with generated:
+            if args.conc:
+                generate_conc(generated, args.conc)
+            else:
+                generate(generated, args.n)
+        names = [generated.name]
+    try:
+        for name in names:
+            print("%s: %.1f MB" % (name, os.path.getsize(name) / 1e6))
+            for func in (gedcom, lines, records):
+                measure(name, func)
+    finally:
+        if generated:
+            os.remove(generated.name)
+
+
+if __name__ == "__main__":
+    main()
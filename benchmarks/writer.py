@@ -0,0 +1,85 @@
+"""Benchmark of the GEDCOM Writer with worker processes, in MB/s
+
+Merges a generated export into a Tree, like mergemyancestors, and times
+Writer.write_records with 1, 2, 4 and 8 processes, or the numbers of
+processes given as arguments. The output of every run is checked against
+the output of one process.
+
+    python benchmarks/writer.py [-n <individuals>] [processes ...]
+"""
+
+# global imports
+import io
+import os
+import sys
+import time
+import hashlib
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# local imports
+from getmyancestors.classes.tree import Tree  # noqa: E402
+from getmyancestors.classes.gedcom import Gedcom  # noqa: E402
+from getmyancestors.classes.writer import Writer  # noqa: E402
+from gedcom import generate  # noqa: E402
+
+
+class Digest(io.TextIOBase):
+    """a text file hashing what is written"""
+
+    encoding = "utf-8"
+
+    def __init__(self):
+        self.md5 = hashlib.md5()
+
+    def write(self, text):
+        self.md5.update(text.encode("utf-8"))
+        return len(text)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument(
+        "processes", nargs="*", type=int, default=[1, 2, 4, 8], help="[1 2 4 8]"
+    )
+    parser.add_argument(
+        "-n",
+        type=int,
+        default=50000,
+        help="individuals of the generated export [50000]",
+    )
+    args = parser.parse_args()
+    text = io.StringIO()
+    generate(text, args.n)
+    tree = Tree()
+    tree.merge(Gedcom(io.StringIO(text.getvalue()), tree))
+    tree.merge_notes()
+    tree.reset_num()
+    records = tree.records()
+    print("%s records, %s CPUs" % (len(records), os.cpu_count()))
+    reference = None
+    serial = None
+    for processes in args.processes:
+        digest = Digest()
+        writer = Writer(digest)
+        start = time.perf_counter()
+        writer.write_records(records, processes)
+        writer.flush()
+        elapsed = time.perf_counter() - start
+        serial = serial or elapsed
+        reference = reference or digest.md5.hexdigest()
+        print(
+            "  %2s processes %7.2f s %7.1f MB/s  x%.1f%s"
+            % (
+                processes,
+                elapsed,
+                writer.written / 1e6 / max(elapsed, 1e-9),
+                serial / max(elapsed, 1e-9),
+                "" if digest.md5.hexdigest() == reference else "  DIFFERENT OUTPUT",
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -2,5 +2,6 @@
 
 from . import getmyancestors
 from . import mergemyancestors
+from . import gedcomdiff
 
 __version__ = "1.1.2"
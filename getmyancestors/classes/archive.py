@@ -0,0 +1,189 @@
+# global imports
+import json
+import zlib
+import struct
+import threading
+from urllib.parse import urlparse, parse_qs
+
+# local imports
+from getmyancestors.classes.session import Session
+
+# first bytes of an archive file
+ARCHIVE_MAGIC = b"GMAPACK1"
+
+# URL of the batch persons requests, split by fid in the archive
+PERSONS_URL = "/platform/tree/persons?pids="
+
+
+def persons_key(fid):
+    """return the archive key of a person"""
+    return "persons/" + fid
+
+
+def place_key(place_id):
+    """return the archive key of a place"""
+    return "places/" + place_id
+
+
+def related(rel):
+    """return the fids of the persons of a relationship"""
+    return {
+        rel[role]["resourceId"]
+        for role in ("parent1", "parent2", "child", "person1", "person2")
+        if role in rel
+    }
+
+
+class Archive:
+    """Pack file of the raw GEDCOM X data downloaded from FamilySearch
+    Each payload is stored as zlib compressed JSON, appended to the file
+    with its length. The index mapping keys to offsets is written at the
+    end on close, followed by its offset and the magic bytes. Batch
+    persons responses are split by fid, places are stored by id and the
+    other responses by URL.
+    :param filename: the archive file
+    :param mode: "r" to read an archive, "w" to write a new one
+    """
+
+    def __init__(self, filename, mode="r"):
+        self.mode = mode
+        self.lock = threading.Lock()
+        self.file = open(filename, mode + "b")
+        if mode == "w":
+            self.file.write(ARCHIVE_MAGIC)
+            self.index = dict()
+        else:
+            # the magic bytes, then the offset of the index and the magic bytes
+            magic = None
+            if self.file.seek(0, 2) >= 8 + 16:
+                self.file.seek(-16, 2)
+                offset, magic = struct.unpack("<Q8s", self.file.read(16))
+                self.file.seek(0)
+            if magic != ARCHIVE_MAGIC or self.file.read(8) != ARCHIVE_MAGIC:
+                self.file.close()
+                raise ValueError("%s is not a getmyancestors archive" % filename)
+            self.file.seek(offset)
+            self.index = json.loads(self.__read())
+
+    def __read(self):
+        (size,) = struct.unpack("<I", self.file.read(4))
+        return zlib.decompress(self.file.read(size))
+
+    def __write(self, data):
+        """append a zlib compressed blob and return its offset"""
+        blob = zlib.compress(data)
+        offset = self.file.tell()
+        self.file.write(struct.pack("<I", len(blob)) + blob)
+        return offset
+
+    def put(self, key, data):
+        """store a JSON payload under a key"""
+        data = json.dumps(data, separators=(",", ":")).encode("utf-8")
+        with self.lock:
+            self.index[key] = self.__write(data)
+
+    def get(self, key):
+        """return the JSON payload stored under a key, or None"""
+        if key not in self.index:
+            return None
+        with self.lock:
+            self.file.seek(self.index[key])
+            return json.loads(self.__read())
+
+    def add(self, url, data):
+        """store a response, split by fid for batch persons requests"""
+        if not url.startswith(PERSONS_URL):
+            self.put(url, data)
+            return
+        for place in data.get("places", ()):
+            self.put(place_key(place["id"]), place)
+        for person in data["persons"]:
+            fid = person["id"]
+            self.put(
+                persons_key(fid),
+                {
+                    "persons": [person],
+                    "childAndParentsRelationships": [
+                        rel
+                        for rel in data.get("childAndParentsRelationships", ())
+                        if fid in related(rel)
+                    ],
+                    "relationships": [
+                        rel
+                        for rel in data.get("relationships", ())
+                        if fid in related(rel)
+                    ],
+                },
+            )
+
+    def persons(self, fids):
+        """rebuild a batch persons response from the stored fids"""
+        data = {"persons": [], "childAndParentsRelationships": [], "relationships": []}
+        rels = set()
+        places = set()
+        for fid in fids:
+            part = self.get(persons_key(fid))
+            if not part:
+                continue
+            data["persons"] += part["persons"]
+            for kind in ("childAndParentsRelationships", "relationships"):
+                for rel in part[kind]:
+                    key = json.dumps(rel, sort_keys=True)
+                    if key not in rels:
+                        rels.add(key)
+                        data[kind].append(rel)
+            for fact in part["persons"][0].get("facts", ()):
+                description = fact.get("place", {}).get("description", "")
+                places.add(description[1:])
+        data["places"] = [
+            place for place in map(self.get, map(place_key, places)) if place
+        ]
+        return data if data["persons"] else None
+
+    def fids(self):
+        """return the fids of the stored persons"""
+        return [key[8:] for key in self.index if key.startswith("persons/")]
+
+    def close(self):
+        """write the index and close the file"""
+        with self.lock:
+            if self.mode == "w":
+                offset = self.__write(json.dumps(self.index).encode("utf-8"))
+                self.file.write(struct.pack("<Q8s", offset, ARCHIVE_MAGIC))
+            self.file.close()
+
+
+class ArchiveSession(Session):
+    """Session replaying the responses stored in an Archive, without network
+    :param archive: an Archive object opened for reading
+    :param verbose: True to active verbose mode
+    :param logfile: a file object or similar
+    """
+
+    def __init__(self, archive, verbose=False, logfile=False):
+        self.replay = archive
+        super().__init__(None, None, verbose=verbose, logfile=logfile)
+
+    @property
+    def logged(self):
+        return True
+
+    def login(self):
+        """read the user of the archived session instead of logging in"""
+        user = self.replay.get("session") or dict()
+        self.fid = user.get("fid")
+        self.lang = user.get("lang")
+        self.display_name = user.get("display_name")
+
+    def get_url(self, url, headers=None, no_api=False):
+        """retrieve JSON structure from the archive"""
+        with self.counter_lock:
+            self.counter += 1
+        self.write_log("Reading: " + url)
+        if url.startswith(PERSONS_URL):
+            query = parse_qs(urlparse(url).query)
+            return self.replay.persons(query["pids"][0].split(","))
+        data = self.replay.get(url)
+        if data is None:
+            self.write_log("WARNING: not in archive: " + url)
+        return data
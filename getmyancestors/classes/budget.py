@@ -0,0 +1,58 @@
+# global imports
+import time
+import threading
+
+
+class Budget:
+    """Limit the cost of a download
+    :param fs: a Session object, its counter is the number of HTTP requests
+    :param max_requests: maximum number of HTTP requests
+    :param max_persons: maximum number of individuals
+    :param deadline: maximum duration in seconds
+    :param reserve: share of the budget kept for optional requests
+                    (sources, memories, notes, ordinances and contributors)
+    """
+
+    def __init__(
+        self, fs=None, max_requests=None, max_persons=None, deadline=None, reserve=0.2
+    ):
+        self.fs = fs
+        self.max_requests = max_requests
+        self.max_persons = max_persons
+        self.deadline = deadline
+        self.reserve = reserve
+        self.start = time.time()
+        self.skipped = 0
+        self.lock = threading.Lock()
+
+    def left(self):
+        """share of the budget left, between 0 and 1"""
+        left = 1
+        if self.max_requests:
+            left = min(left, 1 - self.fs.counter / self.max_requests)
+        if self.deadline:
+            left = min(left, 1 - (time.time() - self.start) / self.deadline)
+        return max(left, 0)
+
+    def crawl(self):
+        """True if new individuals may still be downloaded"""
+        return self.left() > self.reserve
+
+    def enrich(self):
+        """True if an optional request may still be sent"""
+        if self.left() > 0:
+            return True
+        with self.lock:
+            self.skipped += 1
+        return False
+
+    def select(self, fids, count, distance):
+        """keep the individuals nearest to the starting ones within the budget
+        :param fids: a list of new fids
+        :param count: number of individuals already downloaded
+        :param distance: a dict fid -> generations from the starting individuals
+        """
+        fids = sorted(fids, key=lambda fid: distance.get(fid, 0))
+        if self.max_persons is not None:
+            fids = fids[: max(self.max_persons - count, 0)]
+        return fids
@@ -0,0 +1,124 @@
+# global imports
+import io
+import gzip
+import lzma
+import queue
+import argparse
+import threading
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# local imports
+from getmyancestors.classes.constants import BUFFER_SIZE, COMPRESSION_QUEUE
+
+# file extensions of the compressed formats
+EXTENSIONS = (".gz", ".xz", ".zst")
+
+
+def compressed(name):
+    """return the extension of a compressed file name, or None"""
+    for extension in EXTENSIONS:
+        if str(name).lower().endswith(extension):
+            return extension
+    return None
+
+
+def open_binary(name, mode):
+    """open a compressed binary file, the format depends on the extension
+    :param mode: "rb" or "wb"
+    """
+    extension = compressed(name)
+    if extension == ".gz":
+        return gzip.open(name, mode)
+    if extension == ".xz":
+        return lzma.open(name, mode)
+    if zstandard is None:
+        raise OSError("the zstandard package is required to open %s" % name)
+    if mode == "rb":
+        return zstandard.ZstdDecompressor().stream_reader(open(name, "rb"))
+    return zstandard.ZstdCompressor().stream_writer(open(name, "wb"))
+
+
+class Compressor(io.RawIOBase):
+    """Compress data in a background thread
+    Written chunks are queued and written to the compressed file by the
+    thread, so that compression overlaps the GEDCOM serialization. The
+    thread is started by the first write, so that worker processes can be
+    forked before.
+    :param file: a compressed binary file object
+    :param name: the file name
+    """
+
+    def __init__(self, file, name=None):
+        super().__init__()
+        self.file = file
+        self.name = name
+        self.queue = queue.Queue(COMPRESSION_QUEUE)
+        self.error = None
+        self.thread = None
+
+    def __work(self):
+        while True:
+            chunk = self.queue.get()
+            if chunk is None:
+                return
+            if not self.error:
+                try:
+                    self.file.write(chunk)
+                except Exception as e:
+                    self.error = e
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        if self.error:
+            raise self.error
+        if not self.thread:
+            self.thread = threading.Thread(target=self.__work, daemon=True)
+            self.thread.start()
+        self.queue.put(bytes(b))
+        return len(b)
+
+    def close(self):
+        if not self.closed:
+            if self.thread:
+                self.queue.put(None)
+                self.thread.join()
+            self.file.close()
+            super().close()
+            if self.error:
+                raise self.error
+
+
+def open_file(name, mode="r", encoding="UTF-8", buffer_size=None):
+    """open a GEDCOM file, compressed with gzip, xz or zstd according to
+    its extension, or plain text
+    :param mode: "r" or "w"
+    :param buffer_size: size of the write buffer of compressed files
+    """
+    if not compressed(name):
+        return open(name, mode, encoding=encoding)
+    if "r" in mode:
+        return io.TextIOWrapper(io.BufferedReader(open_binary(name, "rb")), encoding)
+    return io.TextIOWrapper(
+        io.BufferedWriter(
+            Compressor(open_binary(name, "wb"), name), buffer_size or BUFFER_SIZE
+        ),
+        encoding,
+    )
+
+
+class FileType(argparse.FileType):
+    """argparse.FileType opening compressed files by their extension"""
+
+    def __call__(self, string):
+        if string == "-" or not compressed(string):
+            return super().__call__(string)
+        try:
+            return open_file(string, self._mode, self._encoding)
+        except OSError as e:
+            raise argparse.ArgumentTypeError("can't open '%s': %s" % (string, e)) from e
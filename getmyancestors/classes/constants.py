@@ -44,6 +44,43 @@ ORDINANCES_STATUS = {
     "NotNeeded": "INFANT",
 }
 
+# kinds of requests of the Scheduler, lower priorities are run first
+SCHEDULER_PRIORITIES = {
+    "crawl": 0,
+    "notes": 1,
+    "ordinances": 2,
+    "contributors": 3,
+}
+
+# maximum number of concurrent requests of a kind, no limit if missing
+SCHEDULER_LIMITS = {}
+
+# maximum number of queued notes, ordinances and contributors requests
+SCHEDULER_QUEUE = 1000
+
+# number of characters buffered by the GEDCOM Writer before writing
+BUFFER_SIZE = 1 << 20
+
+# number of records printed by each task of the parallel GEDCOM Writer
+PRINT_RECORDS = 1000
+
+# number of chunks waiting for the compression thread
+COMPRESSION_QUEUE = 16
+
+# number of rows inserted by transaction in SQLite exports
+EXPORT_BATCH = 10000
+
+# GEDCOM parser constants
+# number of characters read at once by the GEDCOM parser
+GEDCOM_BLOCK = 1 << 20
+
+# tags of the records read by read_records
+RECORD_TAGS = ("INDI", "FAM", "SOUR", "NOTE", "SUBM")
+
+# number of records sorted in memory by the external merge
+MERGE_RUN = 100000
+
+
 # mergemyancestors constants and functions
 def reversed_dict(d):
     return {val: key for key, val in d.items()}
@@ -0,0 +1,101 @@
+# global imports
+import json
+import hashlib
+
+# local imports
+from getmyancestors.classes.gedcom import read_records, tokenize
+
+
+def values(record, tags):
+    """return the first values of level 1 substructures by tag, without
+    decoding the substructures of the record"""
+    result = dict()
+    for line in record.lines:
+        token = tokenize(line)
+        if token and token[0] == 1 and token[2] in tags:
+            result.setdefault(token[2], token[3])
+    return result
+
+
+class Fingerprints:
+    """Fingerprints of the individuals and families of a GEDCOM file
+    Individuals are keyed by FamilySearch id and families by the ids of the
+    spouses. The substructures of a record are normalized: references are
+    replaced by the ids of the records referenced (the text of notes) and
+    sorted, as records are written in any order. The fingerprint is a hash
+    of the normalized substructures.
+    :param file: a GEDCOM file object
+    """
+
+    def __init__(self, file):
+        records = list(read_records(file, ("INDI", "FAM", "SOUR", "NOTE")))
+        self.refs = dict()
+        fids = dict()
+        couples = dict()
+        for record in records:
+            if record.tag == "INDI":
+                fids[record.pointer] = (
+                    values(record, ("_FSFTID",)).get("_FSFTID") or record.pointer
+                )
+                self.refs[record.pointer] = "@%s@" % fids[record.pointer]
+            elif record.tag == "FAM":
+                couples[record.pointer] = values(record, ("HUSB", "WIFE"))
+            elif record.tag == "SOUR":
+                key = record.fid or record.get("TITL") or record.pointer
+                self.refs[record.pointer] = "@%s@" % key
+            elif record.tag == "NOTE":
+                self.refs[record.pointer] = json.dumps(record.text, ensure_ascii=False)
+        keys = dict(fids)
+        for pointer, couple in couples.items():
+            keys[pointer] = "%s+%s" % (
+                fids.get(couple.get("HUSB"), ""),
+                fids.get(couple.get("WIFE"), ""),
+            )
+            self.refs[pointer] = "@%s@" % keys[pointer]
+        self.indi = dict()
+        self.fam = dict()
+        for record in records:
+            if record.tag in ("INDI", "FAM"):
+                table = self.indi if record.tag == "INDI" else self.fam
+                table[keys[record.pointer]] = (self.digest(record), record)
+
+    def blocks(self, record):
+        """return the normalized level 1 substructures of a record, sorted"""
+        blocks = list()
+        for line in record.lines:
+            token = tokenize(line)
+            if not token:
+                continue
+            level, _, tag, value = token
+            if value[:1] == "@":
+                value = self.refs.get(value, value)
+            line = "%s %s %s" % (level, tag, value) if value else "%s %s" % (level, tag)
+            if level == 1 or not blocks:
+                blocks.append([line])
+            else:
+                blocks[-1].append(line)
+        return sorted("\n".join(block) for block in blocks)
+
+    def digest(self, record):
+        """return the fingerprint of a record"""
+        return hashlib.sha1("\0".join(self.blocks(record)).encode("utf-8")).digest()
+
+
+def diff(old, new):
+    """compare the records of two GEDCOM files
+    :param old, new: Fingerprints objects
+    :return: tuples (change, tag, key, old record, new record), the change
+    being "+" for added records, "-" for removed and "~" for changed
+    """
+    for tag, old_records, new_records in (
+        ("INDI", old.indi, new.indi),
+        ("FAM", old.fam, new.fam),
+    ):
+        for key, (digest, record) in new_records.items():
+            if key not in old_records:
+                yield "+", tag, key, None, record
+            elif old_records[key][0] != digest:
+                yield "~", tag, key, old_records[key][1], record
+        for key, (digest, record) in old_records.items():
+            if key not in new_records:
+                yield "-", tag, key, record, None
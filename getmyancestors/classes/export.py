@@ -0,0 +1,281 @@
+# global imports
+import os
+import sys
+import json
+import sqlite3
+
+# local imports
+from getmyancestors.classes.tree import Indi, Fam, Source
+from getmyancestors.classes.writer import Writer
+from getmyancestors.classes.constants import EXPORT_BATCH, FACT_TAGS
+
+# SQLite tables, a record is an individual (INDI) or a family (FAM)
+SQLITE_SCHEMA = """
+CREATE TABLE individual (
+    num INTEGER PRIMARY KEY, fid TEXT, gender TEXT, given TEXT, surname TEXT
+);
+CREATE TABLE name (
+    indi INTEGER, type TEXT, given TEXT, surname TEXT, prefix TEXT,
+    suffix TEXT, note INTEGER
+);
+CREATE TABLE family (
+    num INTEGER PRIMARY KEY, fid TEXT, husb INTEGER, wife INTEGER
+);
+CREATE TABLE child (family INTEGER, indi INTEGER);
+CREATE TABLE fact (
+    record TEXT, num INTEGER, tag TEXT, type TEXT, value TEXT, date TEXT,
+    place TEXT, latitude TEXT, longitude TEXT, note INTEGER
+);
+CREATE TABLE ordinance (
+    record TEXT, num INTEGER, tag TEXT, date TEXT, temple TEXT, status TEXT,
+    famc INTEGER
+);
+CREATE TABLE memory (indi INTEGER, description TEXT, url TEXT);
+CREATE TABLE source (
+    num INTEGER PRIMARY KEY, fid TEXT, title TEXT, citation TEXT, url TEXT
+);
+CREATE TABLE citation (record TEXT, num INTEGER, source INTEGER, page TEXT);
+CREATE TABLE note (num INTEGER PRIMARY KEY, text TEXT);
+CREATE TABLE note_link (record TEXT, num INTEGER, note INTEGER);
+"""
+
+# SQLite indexes, created once the tables are filled
+SQLITE_INDEXES = """
+CREATE INDEX individual_fid ON individual (fid);
+CREATE INDEX individual_surname ON individual (surname);
+CREATE INDEX name_indi ON name (indi);
+CREATE INDEX name_surname ON name (surname);
+CREATE INDEX family_fid ON family (fid);
+CREATE INDEX family_husb ON family (husb);
+CREATE INDEX family_wife ON family (wife);
+CREATE INDEX child_family ON child (family);
+CREATE INDEX child_indi ON child (indi);
+CREATE INDEX fact_record ON fact (record, num);
+CREATE INDEX fact_date ON fact (date);
+CREATE INDEX fact_place ON fact (place);
+CREATE INDEX ordinance_record ON ordinance (record, num);
+CREATE INDEX source_fid ON source (fid);
+CREATE INDEX citation_record ON citation (record, num);
+CREATE INDEX note_link_record ON note_link (record, num);
+"""
+
+# individual LDS ordinances and their GEDCOM tags
+INDI_ORDINANCES = (
+    ("baptism", "BAPL"),
+    ("confirmation", "CONL"),
+    ("initiatory", "WAC"),
+    ("endowment", "ENDL"),
+    ("sealing_child", "SLGC"),
+)
+
+
+def num(record):
+    """return the GEDCOM identifier of a record or None"""
+    return record.num if record else None
+
+
+def name_dict(name, typ=None):
+    """return a Name as a dict"""
+    return {
+        "type": typ,
+        "given": name.given,
+        "surname": name.surname,
+        "prefix": name.prefix,
+        "suffix": name.suffix,
+        "note": num(name.note),
+    }
+
+
+def fact_dict(fact):
+    """return a Fact as a dict, tag is its GEDCOM tag"""
+    latitude, longitude = fact.map or (None, None)
+    return {
+        "tag": FACT_TAGS.get(fact.type, "EVEN"),
+        "type": fact.type,
+        "value": fact.value,
+        "date": fact.date,
+        "place": fact.place,
+        "latitude": latitude,
+        "longitude": longitude,
+        "note": num(fact.note),
+    }
+
+
+def ordinance_dict(ordinance, tag):
+    """return an Ordinance as a dict"""
+    return {
+        "tag": tag,
+        "date": ordinance.date,
+        "temple": ordinance.temple_code,
+        "status": ordinance.status,
+        "famc": num(ordinance.famc),
+    }
+
+
+def sources_list(sources):
+    """return the (Source, quote) pairs of a record as a list of dicts"""
+    return [
+        {"source": source.num, "page": quote}
+        for source, quote in sorted(sources, key=lambda x: x[0].num)
+    ]
+
+
+def record_dict(record):
+    """return an Indi, Fam, Source or Note object as a dict"""
+    if isinstance(record, Indi):
+        names = [name_dict(record.name)] if record.name else []
+        names += [name_dict(o, "nickname") for o in record.nicknames]
+        names += [name_dict(o, "birth") for o in record.birthnames]
+        names += [name_dict(o, "aka") for o in record.aka]
+        names += [name_dict(o, "married") for o in record.married]
+        return {
+            "record": "INDI",
+            "num": record.num,
+            "fid": record.fid,
+            "gender": record.gender,
+            "names": names,
+            "facts": [fact_dict(o) for o in record.facts],
+            "ordinances": [
+                ordinance_dict(getattr(record, attr), tag)
+                for attr, tag in INDI_ORDINANCES
+                if getattr(record, attr)
+            ],
+            "memories": [
+                {"description": o.description, "url": o.url} for o in record.memories
+            ],
+            "famc": sorted(record.famc_num),
+            "fams": sorted(record.fams_num),
+            "notes": sorted(o.num for o in record.notes),
+            "sources": sources_list(record.sources),
+        }
+    if isinstance(record, Fam):
+        return {
+            "record": "FAM",
+            "num": record.num,
+            "fid": record.fid,
+            "husb": record.husb_num,
+            "wife": record.wife_num,
+            "children": sorted(record.chil_num),
+            "facts": [fact_dict(o) for o in record.facts],
+            "ordinances": (
+                [ordinance_dict(record.sealing_spouse, "SLGS")]
+                if record.sealing_spouse
+                else []
+            ),
+            "notes": sorted(o.num for o in record.notes),
+            "sources": sources_list(record.sources),
+        }
+    if isinstance(record, Source):
+        return {
+            "record": "SOUR",
+            "num": record.num,
+            "fid": record.fid,
+            "title": record.title,
+            "citation": record.citation,
+            "url": record.url,
+            "notes": sorted(o.num for o in record.notes),
+        }
+    return {"record": "NOTE", "num": record.num, "text": record.text}
+
+
+def write_jsonl(tree, file=sys.stdout, buffer_size=None):
+    """write the tree in JSON Lines format, one record by line
+    :param tree: a Tree object, with its identifiers reset
+    :return: the Writer used, with the number of bytes written
+    """
+    writer = Writer(file, buffer_size)
+    for record in tree.records():
+        writer.write(json.dumps(record_dict(record), ensure_ascii=False) + "\n")
+    writer.flush()
+    return writer
+
+
+class SQLite:
+    """Insert rows in a SQLite database by batches
+    :param filename: the database file, replaced if it exists
+    :param batch_size: number of rows inserted by transaction
+    """
+
+    def __init__(self, filename, batch_size=None):
+        if os.path.exists(filename):
+            os.remove(filename)
+        self.db = sqlite3.connect(filename)
+        self.db.execute("PRAGMA synchronous = OFF")
+        self.db.execute("PRAGMA journal_mode = MEMORY")
+        self.db.executescript(SQLITE_SCHEMA)
+        self.batch_size = batch_size or EXPORT_BATCH
+        self.rows = dict()
+        self.size = 0
+
+    def add(self, table, *row):
+        """queue a row, insert the queued rows once the batch is full"""
+        self.rows.setdefault(table, list()).append(row)
+        self.size += 1
+        if self.size >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """insert the queued rows in one transaction"""
+        with self.db:
+            for table, rows in self.rows.items():
+                self.db.executemany(
+                    "INSERT INTO %s VALUES (%s)"
+                    % (table, ", ".join("?" * len(rows[0]))),
+                    rows,
+                )
+        self.rows.clear()
+        self.size = 0
+
+    def add_record(self, data):
+        """queue the rows of a record returned by record_dict"""
+        record, n = data["record"], data["num"]
+        if record == "INDI":
+            name = data["names"][0] if data["names"] else {}
+            self.add(
+                "individual",
+                n,
+                data["fid"],
+                data["gender"],
+                name.get("given"),
+                name.get("surname"),
+            )
+            for o in data["names"]:
+                self.add("name", n, *o.values())
+            for o in data["memories"]:
+                self.add("memory", n, o["description"], o["url"])
+        elif record == "FAM":
+            self.add("family", n, data["fid"], data["husb"], data["wife"])
+            for chil in data["children"]:
+                self.add("child", n, chil)
+        elif record == "SOUR":
+            self.add(
+                "source", n, data["fid"], data["title"], data["citation"], data["url"]
+            )
+        else:
+            self.add("note", n, data["text"])
+        for o in data.get("facts", ()):
+            self.add("fact", record, n, *o.values())
+        for o in data.get("ordinances", ()):
+            self.add("ordinance", record, n, *o.values())
+        for o in data.get("sources", ()):
+            self.add("citation", record, n, o["source"], o["page"])
+        for o in data.get("notes", ()):
+            self.add("note_link", record, n, o)
+
+    def close(self):
+        """insert the last rows, create the indexes and close the database"""
+        self.flush()
+        self.db.executescript(SQLITE_INDEXES)
+        self.db.close()
+
+
+def write_sqlite(tree, filename, batch_size=None):
+    """write the tree in a SQLite database
+    :param tree: a Tree object, with its identifiers reset
+    :param filename: the database file, replaced if it exists
+    :param batch_size: number of rows inserted by transaction
+    """
+    db = SQLite(filename, batch_size)
+    for record in tree.records():
+        db.add_record(record_dict(record))
+    db.close()
@@ -0,0 +1,230 @@
+# global imports
+import re
+import json
+import heapq
+import shutil
+import hashlib
+import tempfile
+from itertools import groupby
+
+# local imports
+from getmyancestors.classes.tree import Tree
+from getmyancestors.classes.gedcom import read_records, tokenize
+from getmyancestors.classes.writer import Writer
+from getmyancestors.classes.constants import FACT_TYPES, MERGE_RUN
+
+# record types in the order of the merged file
+RECORDS = ("INDI", "FAM", "SOUR", "NOTE")
+LETTERS = "IFSN"
+
+# reference to a record by its merge key, replaced by its pointer at the end
+SYMBOL = re.compile("\x01([IFSN])([^\x02]*)\x02")
+
+# substructures of an individual written after its ordinances
+INDI_LINKS = ("SLGC", "FAMS", "FAMC", "_FSFTID", "NOTE", "SOUR")
+
+
+def symbol(letter, key):
+    """return the reference to a record of the merged file"""
+    return "\x01%s%s\x02" % (letter, key)
+
+
+def blocks(lines):
+    """split the lines of a record into its level 0 line and level 1
+    substructures"""
+    result = list()
+    for line in lines:
+        if line[:2] == "1 " or not result:
+            result.append([line])
+        else:
+            result[-1].append(line)
+    return result
+
+
+def tag(block):
+    """return the tag of a substructure"""
+    return block[0].split(" ", 2)[1]
+
+
+def merge_indi(records):
+    """merge the records of an individual, in file order
+    The last record wins, except for the FAMS and FAMC links which are
+    merged, and the first sealing to parents linked to a family, kept.
+    """
+    fams = dict()
+    famc = dict()
+    sealing = None
+    for lines in records:
+        current = None
+        for block in blocks(lines):
+            if tag(block) == "FAMS":
+                fams[block[0]] = None
+            elif tag(block) == "FAMC":
+                famc[block[0]] = None
+            elif tag(block) == "SLGC":
+                current = block
+        if not (sealing and any(line[:7] == "2 FAMC " for line in sealing)):
+            sealing = current
+    result = list()
+    links = (sealing or []) + list(fams) + list(famc)
+    for block in blocks(records[-1]):
+        if links and tag(block) in INDI_LINKS:
+            result += links
+            links = None
+        if tag(block) not in ("SLGC", "FAMS", "FAMC"):
+            result += block
+    return result + (links or [])
+
+
+def merge_fam(records):
+    """merge the records of a family, in file order
+    Children are merged, facts, notes, sources and the id are taken from
+    the last record having some, the sealing to spouse from the last record.
+    """
+    spouses = dict()
+    children = dict()
+    facts = notes = sources = fid = sealing = None
+    for lines in records:
+        parts = blocks(lines[1:])
+        for block in parts:
+            if tag(block) in ("HUSB", "WIFE"):
+                spouses[block[0]] = None
+            elif tag(block) == "CHIL":
+                children[block[0]] = None
+        facts = [block for block in parts if tag(block) in FACT_TYPES] or facts
+        notes = [block for block in parts if tag(block) == "NOTE"] or notes
+        sources = [block for block in parts if tag(block) == "SOUR"] or sources
+        fid = [block for block in parts if tag(block) == "_FSFTID"] or fid
+        sealing = [block for block in parts if tag(block) == "SLGS"]
+    result = [records[-1][0]] + list(spouses) + list(children)
+    for block in (
+        (facts or []) + sealing + (fid or []) + (notes or []) + (sources or [])
+    ):
+        result += block
+    return result
+
+
+def merge_first(records):
+    """keep the first record, for sources and notes"""
+    return records[0]
+
+
+MERGERS = (merge_indi, merge_fam, merge_first, merge_first)
+
+
+class ExternalMerge:
+    """Merge GEDCOM files with bounded memory
+    The records of each file are rewritten with references by merge key
+    (fid for individuals, husband and wife fids for families, REFN for
+    sources, text hash for notes), sorted in runs of run_size records
+    saved in temporary files, then merged with a k-way merge. A last pass
+    replaces the merge keys with the new GEDCOM identifiers. Only the
+    identifiers are kept in memory, not the records.
+    :param run_size: number of records sorted in memory
+    """
+
+    def __init__(self, run_size=None):
+        self.run_size = run_size or MERGE_RUN
+        self.tree = Tree()
+        self.runs = list()
+        self.entries = list()
+        self.count = 0
+
+    def __scan(self, file, index):
+        """return the merge keys of the records of a file by pointer"""
+        symbols = dict()
+        couples = dict()
+        for record in read_records(file):
+            if record.tag == "INDI":
+                symbols[record.pointer] = ("I", record.get("_FSFTID") or "")
+            elif record.tag == "FAM":
+                couples[record.pointer] = (record.get("HUSB"), record.get("WIFE"))
+            elif record.tag == "SOUR":
+                key = record.get("REFN") or "%s:%s" % (index, record.pointer)
+                symbols[record.pointer] = ("S", key)
+            elif record.tag == "NOTE":
+                key = hashlib.sha1(record.text.encode("utf-8")).hexdigest()
+                symbols[record.pointer] = ("N", key)
+            elif not self.tree.display_name or not self.tree.lang:
+                self.tree.display_name = self.tree.display_name or record.get("NAME")
+                self.tree.lang = self.tree.lang or record.get("LANG")
+        for pointer, (husb, wife) in couples.items():
+            husb = symbols.get(husb, ("I", ""))[1] if husb else ""
+            wife = symbols.get(wife, ("I", ""))[1] if wife else ""
+            symbols[pointer] = ("F", "%s,%s" % (husb, wife))
+        return symbols
+
+    def __flush(self):
+        """save the sorted entries in a new run"""
+        if self.entries:
+            self.entries.sort()
+            run = tempfile.TemporaryFile("w+", encoding="utf-8")
+            for entry in self.entries:
+                run.write(json.dumps(entry) + "\n")
+            run.seek(0)
+            self.runs.append(run)
+            self.entries.clear()
+
+    def add_file(self, file):
+        """add the records of a GEDCOM file, read twice"""
+        if not file.seekable():
+            spool = tempfile.TemporaryFile("w+", encoding="utf-8")
+            shutil.copyfileobj(file, spool)
+            file = spool
+        file.seek(0)
+        symbols = self.__scan(file, self.count)
+        file.seek(0)
+        for seq, record in enumerate(read_records(file, RECORDS)):
+            head = "0 %s %s" % (symbol(*symbols[record.pointer]), record.tag)
+            lines = [head + " " + record.value if record.value else head]
+            for line in record.lines:
+                token = tokenize(line)
+                if not token:
+                    continue
+                level, pointer, tag, value = token
+                if value[:1] == "@" and value in symbols:
+                    value = symbol(*symbols[value])
+                lines.append(
+                    "%s %s %s" % (level, tag, value)
+                    if value
+                    else "%s %s" % (level, tag)
+                )
+            key = symbols[record.pointer][1]
+            self.entries.append(
+                (RECORDS.index(record.tag), key, self.count, seq, lines)
+            )
+            if len(self.entries) >= self.run_size:
+                self.__flush()
+        self.count += 1
+
+    def merge(self, file, buffer_size=None):
+        """write the merged GEDCOM file
+        :return: the Writer used, with the number of bytes written
+        """
+        self.__flush()
+        nums = {letter: dict() for letter in LETTERS}
+        merged = tempfile.TemporaryFile("w+", encoding="utf-8")
+        entries = heapq.merge(*(map(json.loads, run) for run in self.runs))
+        for (rank, key), group in groupby(entries, lambda entry: entry[:2]):
+            nums[LETTERS[rank]][key] = len(nums[LETTERS[rank]]) + 1
+            lines = MERGERS[rank]([entry[4] for entry in group])
+            merged.write("\n".join(lines) + "\n")
+        for run in self.runs:
+            run.close()
+        self.runs.clear()
+
+        def pointer(match):
+            letter, key = match.groups()
+            if key not in nums[letter]:
+                nums[letter][key] = len(nums[letter]) + 1
+            return "@%s%s@" % (letter, nums[letter][key])
+
+        writer = Writer(file, buffer_size)
+        self.tree.print_head(writer)
+        merged.seek(0)
+        for line in merged:
+            writer.write(SYMBOL.sub(pointer, line) if "\x01" in line else line)
+        merged.close()
+        self.tree.print_trailer(writer)
+        writer.flush()
+        return writer
@@ -1,3 +1,6 @@
+# global imports
+import time
+
 # mergemyancestors classes
 from getmyancestors.classes.tree import (
     Indi,
@@ -8,8 +11,139 @@ from getmyancestors.classes.tree import (
     Note,
     Ordinance,
     Source,
+    Tree,
+)
+from getmyancestors.classes.compression import open_file
+from getmyancestors.classes.constants import (
+    FACT_TYPES,
+    ORDINANCES,
+    GEDCOM_BLOCK,
+    RECORD_TAGS,
 )
-from getmyancestors.classes.constants import FACT_TYPES, ORDINANCES
+
+
+def read_lines(file, block_size=None):
+    """read a text file by blocks and yield its lines without line breaks
+    :param block_size: number of characters read at once
+    """
+    block_size = block_size or GEDCOM_BLOCK
+    rest = ""
+    while True:
+        block = file.read(block_size)
+        if not block:
+            break
+        lines = (rest + block).split("\n")
+        rest = lines.pop()
+        yield from lines
+    if rest:
+        yield rest
+
+
+def tokenize(line):
+    """split a GEDCOM line into level, pointer, tag and value
+    The value keeps its whitespace, except the line break.
+    :return: a tuple, or None for a blank line
+    """
+    level, _, rest = line.lstrip().partition(" ")
+    if not level:
+        return None
+    if rest[:1] == "@":
+        pointer, _, rest = rest.partition(" ")
+    else:
+        pointer = None
+    tag, _, value = rest.partition(" ")
+    return int(level), pointer, tag.rstrip("\r"), value.rstrip("\r")
+
+
+class Record:
+    """GEDCOM record or substructure, decoded on demand
+    Only the first line of a record is decoded when it is read, the lines
+    of its substructures are decoded by the first call to children.
+    :param level, pointer, tag, value: the first line, as returned by tokenize
+    :param lines: the lines of the substructures, raw or tokenized
+    """
+
+    def __init__(self, level, pointer, tag, value, lines=None):
+        self.level = level
+        self.pointer = pointer
+        self.tag = tag
+        self.value = value
+        self.lines = lines if lines is not None else list()
+        self.__children = None
+
+    @property
+    def num(self):
+        """the GEDCOM identifier, like 12 for @I12@"""
+        return int(self.pointer[2:-1]) if self.pointer else None
+
+    @property
+    def text(self):
+        """the value followed by its CONT and CONC continuation lines"""
+        parts = [self.value]
+        for child in self.children():
+            if child.tag == "CONT":
+                parts.append("\n")
+                parts.append(child.value)
+            elif child.tag == "CONC":
+                parts.append(child.value)
+        return "".join(parts)
+
+    def children(self):
+        """return the substructures as Record objects"""
+        if self.__children is None:
+            self.__children = list()
+            child = None
+            for line in self.lines:
+                token = line if isinstance(line, tuple) else tokenize(line)
+                if not token:
+                    continue
+                if token[0] <= self.level + 1:
+                    child = Record(*token)
+                    self.__children.append(child)
+                elif child:
+                    child.lines.append(token)
+        return self.__children
+
+    def find(self, tag):
+        """return the first substructure with this tag, or None"""
+        for child in self.children():
+            if child.tag == tag:
+                return child
+        return None
+
+    def findall(self, tag):
+        """return the substructures with this tag"""
+        return [child for child in self.children() if child.tag == tag]
+
+    def get(self, tag, default=None):
+        """return the text of the first substructure with this tag"""
+        child = self.find(tag)
+        return child.text if child else default
+
+    @property
+    def fid(self):
+        """the FamilySearch id, from _FSFTID or REFN"""
+        return self.get("_FSFTID") or self.get("REFN")
+
+
+def read_records(file, tags=RECORD_TAGS):
+    """yield the records of a GEDCOM file one at a time
+    Level 0 lines must not be indented. Records with other tags are
+    skipped without being decoded.
+    :param file: a GEDCOM file object
+    :param tags: the tags of the records to yield, like INDI or FAM
+    """
+    record = None
+    for line in read_lines(file):
+        if line[:2] == "0 ":
+            if record:
+                yield record
+            token = tokenize(line)
+            record = Record(*token) if token[2] in tags else None
+        elif record:
+            record.lines.append(line)
+    if record:
+        yield record
 
 
 class Gedcom:
@@ -24,6 +158,8 @@ class Gedcom:
         self.tag = None
         self.data = None
         self.flag = False
+        self.date = self.time = None
+        self.lines = read_lines(file)
         self.indi = dict()
         self.fam = dict()
         self.note = dict()
@@ -51,10 +187,21 @@ class Gedcom:
             elif self.tag == "SOUR" and self.pointer:
                 self.num = int(self.pointer[2 : len(self.pointer) - 1])
                 if self.num not in self.sour:
-                    self.sour[self.num] = Source(num=self.num)
+                    self.sour[self.num] = Source(tree=self.tree, num=self.num)
                 self.__get_source()
             elif self.tag == "SUBM" and self.pointer:
                 self.__get_subm()
+            elif self.tag == "HEAD":
+                self.__get_head()
+
+    def __get_head(self):
+        """Parse the header"""
+        while self.__get_line() and self.level > 0:
+            if self.tag == "DATE" and self.level == 1:
+                self.date = self.data
+            elif self.tag == "TIME" and self.level == 2:
+                self.time = self.data
+        self.flag = True
 
     def __get_subm(self):
         while self.__get_line() and self.level > 0:
@@ -72,20 +219,13 @@ class Gedcom:
         if self.flag:
             self.flag = False
             return True
-        words = self.f.readline().split()
-
-        if not words:
-            return False
-        self.level = int(words[0])
-        if words[1][0] == "@":
-            self.pointer = words[1]
-            self.tag = words[2]
-            self.data = " ".join(words[3:])
-        else:
-            self.pointer = None
-            self.tag = words[1]
-            self.data = " ".join(words[2:])
-        return True
+        for line in self.lines:
+            token = tokenize(line)
+            if token:
+                self.level, self.pointer, self.tag, self.data = token
+                return True
+        self.level, self.pointer, self.tag, self.data = 0, None, None, ""
+        return False
 
     def __get_indi(self):
         """Parse an individual"""
@@ -148,27 +288,29 @@ class Gedcom:
         self.flag = True
 
     def __get_name(self):
-        """Parse a name"""
+        """Parse a name
+        the name is added to a set once parsed, as its hash depends on its
+        values
+        """
         parts = self.__get_text().split("/")
         name = Name()
-        added = False
+        names = None
         name.given = parts[0].strip()
         name.surname = parts[1].strip()
         if parts[2]:
             name.suffix = parts[2]
         if not self.indi[self.num].name:
             self.indi[self.num].name = name
-            added = True
+        else:
+            names = self.indi[self.num].birthnames
         while self.__get_line() and self.level > 1:
             if self.tag == "NPFX":
                 name.prefix = self.data
             elif self.tag == "TYPE":
                 if self.data == "aka":
-                    self.indi[self.num].aka.add(name)
-                    added = True
+                    names = self.indi[self.num].aka
                 elif self.data == "married":
-                    self.indi[self.num].married.add(name)
-                    added = True
+                    names = self.indi[self.num].married
             elif self.tag == "NICK":
                 nick = Name()
                 nick.given = self.data
@@ -178,13 +320,14 @@ class Gedcom:
                 if num not in self.note:
                     self.note[num] = Note(tree=self.tree, num=num)
                 name.note = self.note[num]
-        if not added:
-            self.indi[self.num].birthnames.add(name)
+        if names is not None:
+            names.add(name)
         self.flag = True
 
     def __get_fact(self):
         """Parse a fact"""
         fact = Fact()
+        parts = list()
         if self.tag != "EVEN":
             fact.type = FACT_TYPES[self.tag]
             fact.value = self.data
@@ -200,15 +343,19 @@ class Gedcom:
             elif self.tag == "NOTE":
                 if self.data[:12] == "Description:":
                     fact.value = self.data[13:]
+                    parts.clear()
                     continue
                 num = int(self.data[2 : len(self.data) - 1])
                 if num not in self.note:
                     self.note[num] = Note(tree=self.tree, num=num)
                 fact.note = self.note[num]
             elif self.tag == "CONT":
-                fact.value += "\n" + self.data
+                parts.append("\n")
+                parts.append(self.data)
             elif self.tag == "CONC":
-                fact.value += self.data
+                parts.append(self.data)
+        if parts:
+            fact.value += "".join(parts)
         self.flag = True
         return fact
 
@@ -225,17 +372,20 @@ class Gedcom:
         return (latitude, longitude)
 
     def __get_text(self):
-        """Parse a multiline text"""
-        text = self.data
+        """Parse a multiline text
+        the continuation lines are collected and joined once
+        """
+        parts = [self.data]
         while self.__get_line():
             if self.tag == "CONT":
-                text += "\n" + self.data
+                parts.append("\n")
+                parts.append(self.data)
             elif self.tag == "CONC":
-                text += self.data
+                parts.append(self.data)
             else:
                 break
         self.flag = True
-        return text
+        return "".join(parts)
 
     def __get_source(self):
         """Parse a source"""
@@ -263,7 +413,7 @@ class Gedcom:
         """Parse a link to a source"""
         num = int(self.data[2 : len(self.data) - 1])
         if num not in self.sour:
-            self.sour[num] = Source(num=num)
+            self.sour[num] = Source(tree=self.tree, num=num)
         page = None
         while self.__get_line() and self.level > 1:
             if self.tag == "PAGE":
@@ -305,6 +455,36 @@ class Gedcom:
         self.flag = True
         return ordinance
 
+    def detach(self):
+        """drop the file and the Tree, to send the records to another process
+        The notes, the sources and the submitter of the Tree are kept for
+        attach.
+        """
+        self.f = self.lines = None
+        self.notes = self.tree.notes
+        self.sources = self.tree.sources
+        self.display_name = self.tree.display_name
+        self.lang = self.tree.lang
+        for record in (*self.indi.values(), *self.fam.values(), *self.sour.values()):
+            record.tree = None
+        self.tree = None
+        return self
+
+    def attach(self, tree):
+        """add detached records to a Tree, as if the file was parsed into it"""
+        self.tree = tree
+        for record in (*self.indi.values(), *self.fam.values(), *self.sour.values()):
+            record.tree = tree
+        for note in self.notes:
+            tree.add_note(note)
+        for fid, source in self.sources.items():
+            tree.sources.setdefault(fid, source)
+        if not tree.display_name or not tree.lang:
+            tree.display_name = tree.display_name or self.display_name
+            tree.lang = tree.lang or self.lang
+        self.notes = self.sources = None
+        return self
+
     def __add_id(self):
         """Reset GEDCOM identifiers"""
         for num in self.fam:
@@ -323,3 +503,14 @@ class Gedcom:
                 self.indi[num].fams_fid.add(
                     (self.fam[fams].husb_fid, self.fam[fams].wife_fid)
                 )
+
+
+def parse_file(name):
+    """parse a GEDCOM file in a worker process
+    :param name: the file name, compressed files are supported
+    :return: the detached Gedcom object and the parsing duration
+    """
+    start = time.time()
+    with open_file(name) as file:
+        ged = Gedcom(file, Tree())
+    return ged.detach(), time.time() - start
@@ -2,7 +2,6 @@
 import os
 import re
 import time
-import asyncio
 import tempfile
 from threading import Thread
 from diskcache import Cache
@@ -17,9 +16,12 @@ from tkinter import (
 )
 from tkinter.ttk import Frame, Label, Entry, Button, Checkbutton, Treeview, Notebook
 
-from getmyancestors.classes.tree import Indi, Fam, Tree
+from getmyancestors.classes.tree import Tree
 from getmyancestors.classes.gedcom import Gedcom
 from getmyancestors.classes.session import Session
+from getmyancestors.classes.pipeline import Pipeline
+from getmyancestors.classes.runtime import Runtime
+from getmyancestors.classes.compression import open_file
 from getmyancestors.classes.translation import translations
 
 tmp_dir = os.path.join(tempfile.gettempdir(), "fstogedcom")
@@ -96,7 +98,7 @@ class FilesToMerge(Treeview):
                 _("Error"), message=_("File not found: ") + os.path.basename(filename)
             )
             return
-        file = open(filename, "r", encoding="utf-8")
+        file = open_file(filename, "r", encoding="utf-8")
         new_id = self.insert("", 0, text=os.path.basename(filename))
         self.files[new_id] = file
 
@@ -168,69 +170,13 @@ class Merge(Frame):
         )
         tree = Tree()
 
-        indi_counter = 0
-        fam_counter = 0
-
         # read the GEDCOM data
         for file in self.files_to_merge.files.values():
-            ged = Gedcom(file, tree)
-
-            # add informations about individuals
-            for num in ged.indi:
-                fid = ged.indi[num].fid
-                if fid not in tree.indi:
-                    indi_counter += 1
-                    tree.indi[fid] = Indi(tree=tree, num=indi_counter)
-                    tree.indi[fid].tree = tree
-                    tree.indi[fid].fid = ged.indi[num].fid
-                tree.indi[fid].fams_fid |= ged.indi[num].fams_fid
-                tree.indi[fid].famc_fid |= ged.indi[num].famc_fid
-                tree.indi[fid].name = ged.indi[num].name
-                tree.indi[fid].birthnames = ged.indi[num].birthnames
-                tree.indi[fid].nicknames = ged.indi[num].nicknames
-                tree.indi[fid].aka = ged.indi[num].aka
-                tree.indi[fid].married = ged.indi[num].married
-                tree.indi[fid].gender = ged.indi[num].gender
-                tree.indi[fid].facts = ged.indi[num].facts
-                tree.indi[fid].notes = ged.indi[num].notes
-                tree.indi[fid].sources = ged.indi[num].sources
-                tree.indi[fid].memories = ged.indi[num].memories
-                tree.indi[fid].baptism = ged.indi[num].baptism
-                tree.indi[fid].confirmation = ged.indi[num].confirmation
-                tree.indi[fid].endowment = ged.indi[num].endowment
-                if not (
-                    tree.indi[fid].sealing_child and tree.indi[fid].sealing_child.famc
-                ):
-                    tree.indi[fid].sealing_child = ged.indi[num].sealing_child
-
-            # add informations about families
-            for num in ged.fam:
-                husb, wife = (ged.fam[num].husb_fid, ged.fam[num].wife_fid)
-                if (husb, wife) not in tree.fam:
-                    fam_counter += 1
-                    tree.fam[(husb, wife)] = Fam(husb, wife, tree, fam_counter)
-                    tree.fam[(husb, wife)].tree = tree
-                tree.fam[(husb, wife)].chil_fid |= ged.fam[num].chil_fid
-                tree.fam[(husb, wife)].fid = ged.fam[num].fid
-                tree.fam[(husb, wife)].facts = ged.fam[num].facts
-                tree.fam[(husb, wife)].notes = ged.fam[num].notes
-                tree.fam[(husb, wife)].sources = ged.fam[num].sources
-                tree.fam[(husb, wife)].sealing_spouse = ged.fam[num].sealing_spouse
-
-        # merge notes by text
-        tree.notes = sorted(tree.notes, key=lambda x: x.text)
-        for i, n in enumerate(tree.notes):
-            if i == 0:
-                n.num = 1
-                continue
-            if n.text == tree.notes[i - 1].text:
-                n.num = tree.notes[i - 1].num
-            else:
-                n.num = tree.notes[i - 1].num + 1
+            tree.merge(Gedcom(file, tree))
 
         # compute number for family relationships and print GEDCOM file
         tree.reset_num()
-        with open(filename, "w", encoding="utf-8") as file:
+        with open_file(filename, "w", encoding="utf-8") as file:
             tree.print(file)
         messagebox.showinfo(_("Info"), message=_("Files successfully merged"))
 
@@ -463,7 +409,7 @@ class Download(Frame):
         )
         if not filename:
             return
-        with open(filename, "w", encoding="utf-8") as file:
+        with open_file(filename, "w", encoding="utf-8") as file:
             self.tree.print(file)
 
     def login(self):
@@ -493,7 +439,7 @@ class Download(Frame):
             self.btn_valid.config(state="normal")
             self.info("")
             return
-        self.tree = Tree(self.fs)
+        self.tree = Tree(self.fs, runtime=Runtime())
         _ = self.fs._
         self.title.config(text=_("Options"))
         cache.delete("lang")
@@ -553,6 +499,9 @@ class Download(Frame):
         self.btn_valid.config(state="disabled")
         self.info(_("Downloading starting individuals..."))
         self.info_tree = True
+        ordi = self.options.ordinances.get()
+        cont = self.options.contributors.get()
+        self.tree.pipeline = Pipeline(self.tree, ordi, cont)
         self.tree.add_indis(todo)
         todo = set(todo)
         done = set()
@@ -576,34 +525,15 @@ class Download(Frame):
             self.info(_("Downloading spouses and marriage information..."))
             todo = set(self.tree.indi.keys())
             self.tree.add_spouses(todo)
-        ordi = self.options.ordinances.get()
-        cont = self.options.contributors.get()
-
-        async def download_stuff(loop):
-            futures = set()
-            for fid, indi in self.tree.indi.items():
-                futures.add(loop.run_in_executor(None, indi.get_notes))
-                if ordi:
-                    futures.add(
-                        loop.run_in_executor(None, self.tree.add_ordinances, fid)
-                    )
-                if cont:
-                    futures.add(loop.run_in_executor(None, indi.get_contributors))
-            for fam in self.tree.fam.values():
-                futures.add(loop.run_in_executor(None, fam.get_notes))
-                if cont:
-                    futures.add(loop.run_in_executor(None, fam.get_contributors))
-            for future in futures:
-                await future
-
-        loop = asyncio.get_event_loop()
-        self.info(
+        text = (
             _("Downloading notes")
             + ((("," if cont else _(" and")) + _(" ordinances")) if ordi else "")
             + (_(" and contributors") if cont else "")
             + "..."
         )
-        loop.run_until_complete(download_stuff(loop))
+        self.info(text)
+        self.tree.pipeline.join(lambda progress: self.info(text + "\n" + progress))
+        self.tree.runtime.close()
 
         self.tree.reset_num()
         self.btn_valid.config(command=self.save, state="normal", text=_("Save"))
@@ -0,0 +1,116 @@
+# global imports
+import os
+import re
+import json
+import mmap
+
+# local imports
+from getmyancestors.classes.gedcom import Record, tokenize
+
+# level 0 lines and FamilySearch ids of level 1
+INDEX_LINE = re.compile(
+    rb"^0 (?:(@[^@\s]+@) )?([A-Za-z0-9_]+)|^1 (?:_FSFTID|REFN) ([^\s]+)", re.M
+)
+
+
+class Index:
+    """Byte offsets of the records of a plain GEDCOM file
+    The file is scanned once through mmap, the offsets are saved in a
+    sidecar file (the GEDCOM file name followed by .idx) and loaded
+    instead of scanning again while the GEDCOM file is unchanged.
+    :param filename: the GEDCOM file
+    :param rebuild: True to scan the file even if the sidecar file is valid
+    """
+
+    def __init__(self, filename, rebuild=False):
+        self.filename = filename
+        self.sidecar = filename + ".idx"
+        self.records = dict()
+        self.fids = dict()
+        self.file = self.map = None
+        stat = os.stat(filename)
+        self.stamp = [stat.st_size, stat.st_mtime_ns]
+        if rebuild or not self.load():
+            self.build()
+            self.save()
+
+    def load(self):
+        """load the sidecar file, return False if missing or outdated"""
+        try:
+            with open(self.sidecar, "r", encoding="utf-8") as file:
+                data = json.load(file)
+        except (OSError, ValueError):
+            return False
+        if data.get("stamp") != self.stamp:
+            return False
+        self.records = data["records"]
+        self.fids = data["fids"]
+        return True
+
+    def save(self):
+        """write the sidecar file"""
+        with open(self.sidecar, "w", encoding="utf-8") as file:
+            json.dump(
+                {"stamp": self.stamp, "records": self.records, "fids": self.fids},
+                file,
+                separators=(",", ":"),
+            )
+
+    def open(self):
+        """map the GEDCOM file in memory"""
+        if self.map is None:
+            self.file = open(self.filename, "rb")
+            self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        return self.map
+
+    def build(self):
+        """scan the GEDCOM file for the records and their FamilySearch ids
+        An empty file, which cannot be mapped in memory, has no records.
+        """
+        self.records = dict()
+        self.fids = dict()
+        if not self.stamp[0]:
+            return
+        data = self.open()
+        pointer = start = None
+        for match in INDEX_LINE.finditer(data):
+            if match.group(3):
+                if pointer:
+                    self.fids.setdefault(match.group(3).decode("utf-8"), pointer)
+                continue
+            if pointer:
+                self.records[pointer] = [start, match.start()]
+            pointer = match.group(1) and match.group(1).decode("utf-8")
+            start = match.start()
+        if pointer:
+            self.records[pointer] = [start, len(data)]
+
+    def read(self, pointer):
+        """parse one record
+        :param pointer: the record identifier, like @I12@
+        :return: a Record object, or None if not found
+        """
+        if pointer not in self.records:
+            return None
+        start, end = self.records[pointer]
+        lines = self.open()[start:end].decode("utf-8").split("\n")
+        return Record(*tokenize(lines[0]), lines[1:])
+
+    def find(self, fid):
+        """parse the record of a FamilySearch id (_FSFTID or REFN)
+        :return: a Record object, or None if not found
+        """
+        return self.read(self.fids.get(fid))
+
+    def close(self):
+        """unmap the GEDCOM file"""
+        if self.map is not None:
+            self.map.close()
+            self.file.close()
+            self.map = self.file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
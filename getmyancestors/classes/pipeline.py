@@ -0,0 +1,97 @@
+# global imports
+import threading
+
+
+class Pipeline:
+    """Download notes, ordinances and contributors as soon as records exist
+    The requests are scheduled on the executor of the Tree runtime, shared
+    with the crawl so that both kinds of requests overlap under one
+    concurrency limit.
+    :param tree: a Tree object
+    :param ordinances: True to download LDS ordinances
+    :param contributors: True to download contributors
+    """
+
+    def __init__(self, tree, ordinances=False, contributors=False):
+        self.tree = tree
+        self.ordinances = ordinances
+        self.contributors = contributors
+        self.executor = tree.get_runtime().executor
+        self.sealings = list()
+        self.linked = False
+        self.stream = None
+        self.lock = threading.Lock()
+
+    def submit(self, kind, func, *params, indi=None):
+        """queue an optional request
+        :param indi: the individual completed by the request, if streamed
+        """
+        stream = self.stream if indi else None
+
+        def run():
+            try:
+                if self.tree.budget.enrich():
+                    func(*params)
+            finally:
+                if stream:
+                    stream.done(indi)
+
+        if stream:
+            stream.add(indi)
+        self.executor.schedule(kind, run)
+
+    def add_indi(self, indi):
+        """queue the requests of a downloaded individual"""
+        if self.stream:
+            self.stream.add(indi)
+        self.submit("notes", indi.get_notes, indi=indi)
+        if self.ordinances:
+            self.submit("ordinances", self.get_ordinances, indi, indi=indi)
+        if self.contributors:
+            self.submit("contributors", indi.get_contributors, indi=indi)
+        if self.stream:
+            self.stream.done(indi)
+
+    def add_carried(self, indi):
+        """an individual carried over by Refresh needs no request"""
+        if self.stream:
+            self.stream.add(indi)
+            self.stream.done(indi)
+
+    def add_fam(self, fam):
+        """queue the requests of a downloaded couple relationship"""
+        self.submit("notes", fam.get_notes)
+        if self.contributors:
+            self.submit("contributors", fam.get_contributors)
+
+    def get_ordinances(self, indi):
+        """download LDS ordinances, families are linked once the crawl is over"""
+        ret, famc = indi.get_ordinances()
+        with self.lock:
+            if self.linked:
+                self.tree.link_ordinances(indi.fid, ret, famc)
+            else:
+                self.sealings.append((indi.fid, ret, famc))
+
+    def link(self):
+        """link the ordinances to the families, the crawl being over"""
+        with self.lock:
+            self.linked = True
+            for fid, ret, famc in self.sealings:
+                self.tree.link_ordinances(fid, ret, famc)
+            self.sealings.clear()
+
+    def progress(self):
+        """return a text with the number of requests done by kind"""
+        return ", ".join(
+            "%s %s/%s" % (kind, done, total)
+            for kind, (done, total) in self.executor.progress().items()
+            if kind != "crawl"
+        )
+
+    def join(self, callback=None):
+        """wait for all the requests and link the ordinances to the families
+        :param callback: a function called with progress() every second
+        """
+        self.executor.join(callback and (lambda _: callback(self.progress())))
+        self.link()
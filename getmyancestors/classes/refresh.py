@@ -0,0 +1,152 @@
+# global imports
+import time
+import threading
+
+# local imports
+from getmyancestors.classes.tree import Note, Source, Tree, new_num
+from getmyancestors.classes.gedcom import Gedcom
+from getmyancestors.classes.snapshot import Snapshot, is_snapshot
+
+
+class Refresh:
+    """Carry over records unchanged since a previous GEDCOM export
+    :param file: the previous GEDCOM file, or snapshot file
+    :param tree: the Tree being downloaded
+    """
+
+    def __init__(self, file, tree):
+        self.tree = tree
+        name = getattr(file, "name", None)
+        if is_snapshot(name):
+            ged = Snapshot(name, Tree())
+        else:
+            ged = Gedcom(file, Tree())
+        self.indi = {indi.fid: indi for indi in ged.indi.values() if indi.fid}
+        self.fam = {fam.fid: fam for fam in ged.fam.values() if fam.fid}
+        self.couples = {(fam.husb_fid, fam.wife_fid): fam for fam in ged.fam.values()}
+        self.timestamp = None
+        if ged.date:
+            try:
+                self.timestamp = 1000 * time.mktime(
+                    time.strptime(
+                        "%s %s" % (ged.date, ged.time or "00:00:00"),
+                        "%d %b %Y %H:%M:%S",
+                    )
+                )
+            except ValueError:
+                pass
+        self.carried_indi = set()
+        self.carried_fam = set()
+        self.notes = set()
+        self.lock = threading.Lock()
+
+    def changed(self, url):
+        """check a change history feed for changes since the previous export
+        :param url: the changes URL of a person or a couple relationship
+        """
+        if self.timestamp is None:
+            return True
+        data = self.tree.fs.get_url(url, {"Accept": "application/x-gedcomx-atom+json"})
+        if not data:
+            return True
+        return any(
+            entry.get("updated", 0) > self.timestamp for entry in data["entries"]
+        )
+
+    def carry_note(self, note):
+        """add a Note from the previous export to the tree"""
+        if note:
+            with self.lock:
+                if note not in self.notes:
+                    self.notes.add(note)
+                    note.num = new_num(Note)
+                    self.tree.add_note(note)
+        return note
+
+    def carry_source(self, source):
+        """add a Source from the previous export to the tree"""
+        with self.tree.sources_lock:
+            if source.fid in self.tree.sources:
+                return self.tree.sources[source.fid]
+            source.num = new_num(Source)
+            source.tree = self.tree
+            self.tree.sources[source.fid] = source
+        for n in source.notes:
+            self.carry_note(n)
+        return source
+
+    def carry_indi(self, indi):
+        """copy an unchanged individual from the previous export
+        :param indi: the Indi object being downloaded
+        :return: True if the individual was carried over
+        """
+        old = self.indi.get(indi.fid)
+        if not old or self.changed("/platform/tree/persons/%s/changes" % indi.fid):
+            return False
+        for name in {old.name} | old.birthnames | old.aka | old.married:
+            if name:
+                self.carry_note(name.note)
+        for fact in old.facts:
+            self.carry_note(fact.note)
+        indi.name = old.name
+        indi.gender = old.gender
+        indi.nicknames = old.nicknames
+        indi.birthnames = old.birthnames
+        indi.aka = old.aka
+        indi.married = old.married
+        indi.facts = old.facts
+        indi.memories = old.memories
+        indi.notes = set(self.carry_note(n) for n in old.notes)
+        indi.sources = set(
+            (self.carry_source(source), quote) for source, quote in old.sources
+        )
+        indi.baptism = old.baptism
+        indi.confirmation = old.confirmation
+        indi.initiatory = old.initiatory
+        indi.endowment = old.endowment
+        indi.sealing_child = old.sealing_child
+        self.carried_indi.add(indi.fid)
+        return True
+
+    def carry_fam(self, fam):
+        """copy an unchanged couple relationship from the previous export
+        :param fam: the Fam object being downloaded, with its fid set
+        :return: True if the family was carried over
+        """
+        old = self.fam.get(fam.fid)
+        if not old or self.changed(
+            "/platform/tree/couple-relationships/%s/changes" % fam.fid
+        ):
+            return False
+        for fact in old.facts:
+            self.carry_note(fact.note)
+        fam.facts = old.facts
+        fam.notes = set(self.carry_note(n) for n in old.notes)
+        fam.sources = set(
+            (self.carry_source(source), quote) for source, quote in old.sources
+        )
+        fam.sealing_spouse = old.sealing_spouse
+        self.carried_fam.add(fam.fid)
+        return True
+
+    def finish(self):
+        """link carried LDS ordinances to the downloaded families
+        The sealing to spouse of a family comes from the ordinances of the
+        spouses: if both were carried over, none was downloaded, so the
+        sealing of the previous export is kept.
+        """
+        for (husb, wife), fam in self.tree.fam.items():
+            if (
+                not fam.sealing_spouse
+                and husb in self.carried_indi
+                and wife in self.carried_indi
+                and (husb, wife) in self.couples
+            ):
+                fam.sealing_spouse = self.couples[(husb, wife)].sealing_spouse
+        for fid in self.carried_indi:
+            indi = self.tree.indi.get(fid)
+            if indi and indi.sealing_child and indi.sealing_child.famc:
+                famc = indi.sealing_child.famc
+                indi.sealing_child.famc = self.tree.fam.get(
+                    (famc.husb_fid, famc.wife_fid)
+                )
@@ -0,0 +1,51 @@
+# global imports
+import time
+import asyncio
+
+# local imports
+from getmyancestors.classes.scheduler import Scheduler
+
+
+class Runtime:
+    """Event loop and executor shared by a whole download
+    :param max_workers: number of worker threads
+    :param limits: a dict kind -> maximum number of concurrent requests
+    :param idle: seconds before an idle worker thread stops, None to keep it
+                 until close
+    """
+
+    def __init__(self, max_workers=None, limits=None, idle=None):
+        self.loop = asyncio.new_event_loop()
+        self.executor = Scheduler(max_workers, limits, idle=idle)
+        self.start = time.time()
+        self.closed = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def run(self, coro):
+        """run a coroutine on the event loop"""
+        return self.loop.run_until_complete(coro)
+
+    def stats(self):
+        """return a dict describing the runtime"""
+        progress = self.executor.progress()
+        return {
+            "workers": self.executor.max_workers,
+            "threads": self.executor.alive(),
+            "tasks": sum(done for done, _ in progress.values()),
+            "uptime": round(time.time() - self.start),
+            "closed": self.closed,
+        }
+
+    def close(self, cancel=False):
+        """stop the worker threads and close the event loop
+        :param cancel: True to drop the queued requests instead of running them
+        """
+        if not self.closed:
+            self.closed = True
+            self.executor.shutdown(cancel_futures=cancel)
+            self.loop.close()
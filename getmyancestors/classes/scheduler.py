@@ -0,0 +1,210 @@
+# global imports
+import os
+import time
+import threading
+from functools import partial
+from collections import deque
+from concurrent.futures import Executor, Future
+
+# local imports
+from getmyancestors.classes.constants import (
+    SCHEDULER_LIMITS,
+    SCHEDULER_PRIORITIES,
+    SCHEDULER_QUEUE,
+)
+
+
+class Scheduler(Executor):
+    """Bounded priority scheduler for HTTP requests
+    Tasks are grouped by kind, each kind has its own queue, priority and
+    concurrency limit. Tasks submitted with the Executor interface are of
+    kind "crawl" and are never throttled. Once max_pending tasks of the
+    other kinds are queued, schedule blocks, or runs a queued task itself
+    when called from a worker thread.
+    :param max_workers: number of worker threads
+    :param limits: a dict kind -> maximum number of running tasks
+    :param priorities: a dict kind -> priority, lower is run first
+    :param max_pending: maximum number of queued optional tasks
+    :param idle: seconds before an idle worker thread stops, None to keep it
+    """
+
+    def __init__(
+        self,
+        max_workers=None,
+        limits=None,
+        priorities=None,
+        max_pending=None,
+        idle=None,
+    ):
+        self.max_workers = max_workers or min(32, (os.cpu_count() or 1) + 4)
+        self.limits = dict(SCHEDULER_LIMITS, **(limits or {}))
+        self.priorities = dict(SCHEDULER_PRIORITIES, **(priorities or {}))
+        for kind, limit in self.limits.items():
+            if kind not in self.priorities or limit < 1:
+                raise ValueError("invalid limit %s=%s" % (kind, limit))
+        self.max_pending = max_pending or SCHEDULER_QUEUE
+        self.idle = idle
+        self.queues = dict()
+        self.running = dict()
+        self.submitted = dict()
+        self.done = dict()
+        self.pending = 0
+        self.error = None
+        self.closed = False
+        self.cond = threading.Condition()
+        self.workers = set()
+        self.threads = list()
+
+    def __queue(self, kind):
+        if kind not in self.queues:
+            self.queues[kind] = deque()
+            self.running[kind] = self.submitted[kind] = self.done[kind] = 0
+        return self.queues[kind]
+
+    def __start(self):
+        """start a worker thread if needed, to call with the lock"""
+        if len(self.threads) < self.max_workers:
+            thread = threading.Thread(target=self.__work, daemon=True)
+            self.threads.append(thread)
+            thread.start()
+
+    def __pick(self, optional=False, peek=False):
+        """pop the next runnable task, to call with the lock"""
+        for kind in sorted(self.queues, key=lambda k: self.priorities.get(k, 0)):
+            if optional and kind == "crawl":
+                continue
+            limit = self.limits.get(kind)
+            if self.queues[kind] and (limit is None or self.running[kind] < limit):
+                if peek:
+                    return True
+                self.running[kind] += 1
+                if kind != "crawl":
+                    self.pending -= 1
+                self.cond.notify_all()
+                return (kind,) + self.queues[kind].popleft()
+        return None
+
+    def __run(self, kind, future, func, params):
+        """run a task outside the lock"""
+        try:
+            if future:
+                if future.set_running_or_notify_cancel():
+                    try:
+                        future.set_result(func(*params))
+                    except BaseException as e:
+                        future.set_exception(e)
+            else:
+                func(*params)
+        except Exception as e:
+            with self.cond:
+                self.error = self.error or e
+        finally:
+            with self.cond:
+                self.running[kind] -= 1
+                self.done[kind] += 1
+                self.cond.notify_all()
+
+    def __work(self):
+        self.workers.add(threading.get_ident())
+        while True:
+            with self.cond:
+                task = self.__pick()
+                while not task:
+                    if self.closed or not self.cond.wait(self.idle):
+                        if self.closed or not self.__pick(peek=True):
+                            self.threads.remove(threading.current_thread())
+                            self.workers.discard(threading.get_ident())
+                            return
+                    task = self.__pick()
+            self.__run(*task)
+
+    def alive(self):
+        """return the number of worker threads"""
+        with self.cond:
+            return len(self.threads)
+
+    def submit(self, fn, *args, **kwargs):
+        """Executor interface, used by the crawl"""
+        if kwargs:
+            fn = partial(fn, **kwargs)
+        future = Future()
+        with self.cond:
+            if self.closed:
+                raise RuntimeError("cannot schedule new tasks after shutdown")
+            self.__queue("crawl").append((future, fn, args))
+            self.submitted["crawl"] += 1
+            self.__start()
+            self.cond.notify_all()
+        return future
+
+    def schedule(self, kind, func, *params):
+        """queue an optional task, blocking while the queue is full
+        :param kind: the kind of task (notes, ordinances, contributors...)
+        """
+        worker = threading.get_ident() in self.workers
+        with self.cond:
+            if self.closed:
+                raise RuntimeError("cannot schedule new tasks after shutdown")
+            while self.pending >= self.max_pending:
+                task = self.__pick(optional=True) if worker else None
+                if task:
+                    self.cond.release()
+                    try:
+                        self.__run(*task)
+                    finally:
+                        self.cond.acquire()
+                else:
+                    self.cond.wait()
+                if self.closed:
+                    raise RuntimeError("cannot schedule new tasks after shutdown")
+            self.__queue(kind).append((None, func, params))
+            self.submitted[kind] += 1
+            self.pending += 1
+            self.__start()
+            self.cond.notify_all()
+
+    def progress(self):
+        """return a dict kind -> (done, submitted)"""
+        with self.cond:
+            return {
+                kind: (self.done[kind], self.submitted[kind]) for kind in self.queues
+            }
+
+    def join(self, callback=None, interval=1):
+        """wait for all the tasks
+        :param callback: a function called with progress() every interval seconds
+        """
+        last = time.time()
+        with self.cond:
+            while any(self.done[kind] < self.submitted[kind] for kind in self.queues):
+                self.cond.wait(interval)
+                if callback and time.time() - last >= interval:
+                    self.cond.release()
+                    try:
+                        callback(self.progress())
+                    finally:
+                        self.cond.acquire()
+                    last = time.time()
+            if self.error:
+                raise self.error
+
+    def shutdown(self, wait=True, *, cancel_futures=False):
+        """stop the worker threads once the queues are empty
+        :param cancel_futures: True to cancel the queued crawl tasks and drop
+                               the other queued tasks instead of running them
+        """
+        with self.cond:
+            self.closed = True
+            if cancel_futures:
+                for kind, queue in self.queues.items():
+                    for future, _, _ in queue:
+                        if future:
+                            future.cancel()
+                    if kind != "crawl":
+                        self.pending -= len(queue)
+                    self.submitted[kind] -= len(queue)
+                    queue.clear()
+            self.cond.notify_all()
+        if wait:
+            for thread in list(self.threads):
+                thread.join()
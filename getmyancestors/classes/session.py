@@ -1,6 +1,7 @@
 # global imports
 import sys
 import time
+import threading
 from urllib.parse import urlparse, parse_qs
 import webbrowser
 
@@ -20,6 +21,7 @@ class Session(requests.Session):
     :param verbose: True to active verbose mode
     :param logfile: a file object or similar
     :param timeout: time before retry a request
+    The responses are stored in archive, an Archive object, if set.
     """
 
     def __init__(
@@ -42,6 +44,8 @@ class Session(requests.Session):
         self.timeout = timeout
         self.fid = self.lang = self.display_name = None
         self.counter = 0
+        self.counter_lock = threading.Lock()
+        self.archive = None
         self.headers = {"User-Agent": UserAgent().firefox}
         self.login()
 
@@ -150,7 +154,8 @@ class Session(requests.Session):
 
     def get_url(self, url, headers=None, no_api=False):
         """retrieve JSON structure from a FamilySearch URL"""
-        self.counter += 1
+        with self.counter_lock:
+            self.counter += 1
         if headers is None:
             headers = {"Accept": "application/x-gedcomx-v1+json"}
         headers.update(self.headers)
@@ -200,10 +205,13 @@ class Session(requests.Session):
                 time.sleep(self.timeout)
                 continue
             try:
-                return r.json()
+                data = r.json()
             except Exception as e:
                 self.write_log("WARNING: corrupted file from %s, error: %s" % (url, e))
                 return None
+            if self.archive:
+                self.archive.add(url, data)
+            return data
 
     def set_current(self):
         """retrieve FamilySearch current user ID, name and language"""
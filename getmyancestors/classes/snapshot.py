@@ -0,0 +1,270 @@
+# global imports
+import gc
+import sys
+import time
+import struct
+import marshal
+
+# local imports
+from getmyancestors.classes.tree import (
+    Indi,
+    Fact,
+    Fam,
+    Memorie,
+    Name,
+    Note,
+    Ordinance,
+    Source,
+)
+
+# first bytes of a snapshot file
+SNAPSHOT_MAGIC = b"GMATREE\x00"
+
+# version of the layout of the tuples, increased on any change
+SNAPSHOT_VERSION = 2
+
+# marshal format and Python version of the payload, which marshal does not
+# guarantee across Python versions
+SNAPSHOT_PYTHON = (marshal.version, *sys.version_info[:2])
+
+# individual LDS ordinances, in the order of the snapshot
+INDI_ORDINANCES = (
+    "baptism",
+    "confirmation",
+    "initiatory",
+    "endowment",
+    "sealing_child",
+)
+
+
+def is_snapshot(filename):
+    """check if a file is a snapshot from its first bytes"""
+    try:
+        with open(filename, "rb") as file:
+            return file.read(len(SNAPSHOT_MAGIC)) == SNAPSHOT_MAGIC
+    except (OSError, TypeError):
+        return False
+
+
+def write_snapshot(tree, filename):
+    """write the tree in a snapshot file
+    The records are saved as tuples of strings serialized by marshal, the
+    references between records as indexes or fids. The snapshot can only
+    be read by the same Python version.
+    :param tree: a Tree object
+    :param filename: the snapshot file, replaced if it exists
+    """
+    notes = list()
+    note_index = dict()
+
+    def note(o):
+        if not o:
+            return None
+        if id(o) not in note_index:
+            note_index[id(o)] = len(notes)
+            notes.append((o.num, o.text))
+        return note_index[id(o)]
+
+    for o in tree.notes:
+        note(o)
+    sources = list(tree.sources.values())
+    source_index = {id(o): i for i, o in enumerate(sources)}
+
+    def links(record):
+        return (
+            tuple(note(o) for o in record.notes),
+            tuple(
+                (source_index[id(tree.sources.get(source.fid, source))], page)
+                for source, page in record.sources
+                if id(tree.sources.get(source.fid, source)) in source_index
+            ),
+        )
+
+    def source_row(o):
+        return (o.num, o.fid, o.title, o.citation, o.url, tuple(map(note, o.notes)))
+
+    def name(o):
+        return (o.given, o.surname, o.prefix, o.suffix, note(o.note)) if o else None
+
+    def fact(o):
+        return (o.type, o.value, o.date, o.place, o.map, note(o.note))
+
+    def ordinance(o):
+        if not o:
+            return None
+        famc = (o.famc.husb_fid, o.famc.wife_fid) if o.famc else None
+        return (o.date, o.temple_code, o.status, famc)
+
+    indis = [
+        (
+            o.num,
+            o.fid,
+            o.gender,
+            o.living,
+            name(o.name),
+            tuple(map(name, o.nicknames)),
+            tuple(map(name, o.birthnames)),
+            tuple(map(name, o.aka)),
+            tuple(map(name, o.married)),
+            tuple(map(fact, o.facts)),
+            tuple((m.description, m.url) for m in o.memories),
+            tuple(ordinance(getattr(o, attr)) for attr in INDI_ORDINANCES),
+            tuple(o.famc_fid),
+            tuple(o.fams_fid),
+            tuple(o.parents),
+            tuple(o.spouses),
+            tuple(o.children),
+            *links(o),
+        )
+        for o in sorted(tree.indi.values(), key=lambda x: x.num)
+    ]
+    fams = [
+        (
+            o.num,
+            o.husb_fid,
+            o.wife_fid,
+            o.fid,
+            tuple(map(fact, o.facts)),
+            ordinance(o.sealing_spouse),
+            tuple(o.chil_fid),
+            *links(o),
+        )
+        for o in sorted(tree.fam.values(), key=lambda x: x.num)
+    ]
+    sources = list(map(source_row, sources))
+    data = (
+        time.strftime("%d %b %Y"),
+        time.strftime("%H:%M:%S"),
+        tree.display_name,
+        tree.lang,
+        tree.places,
+        notes,
+        sources,
+        indis,
+        fams,
+    )
+    with open(filename, "wb") as file:
+        file.write(struct.pack("<8sI", SNAPSHOT_MAGIC, SNAPSHOT_VERSION))
+        file.write(struct.pack("<III", *SNAPSHOT_PYTHON))
+        marshal.dump(data, file, 4)
+
+
+class Snapshot:
+    """Records of a snapshot file, read into a tree like a Gedcom object
+    The notes and the sources are added to the tree, the individuals, the
+    families and the sources are kept by GEDCOM identifier in indi, fam and
+    sour, for Tree.merge or Refresh.
+    :param filename: the snapshot file
+    :param tree: a Tree object
+    """
+
+    def __init__(self, filename, tree):
+        self.tree = tree
+        with open(filename, "rb") as file:
+            magic, version = struct.unpack("<8sI", file.read(12))
+            if magic != SNAPSHOT_MAGIC:
+                raise ValueError("%s is not a getmyancestors snapshot" % filename)
+            if version != SNAPSHOT_VERSION:
+                raise ValueError(
+                    "%s: unsupported snapshot version %s" % (filename, version)
+                )
+            python = struct.unpack("<III", file.read(12))
+            if python != SNAPSHOT_PYTHON:
+                raise ValueError(
+                    "%s: written by Python %s.%s (marshal version %s), "
+                    "cannot be read by Python %s.%s"
+                    % (filename, *python[1:], python[0], *SNAPSHOT_PYTHON[1:])
+                )
+            data = marshal.loads(file.read())
+        enabled = gc.isenabled()
+        gc.disable()
+        try:
+            self.__load(data)
+        finally:
+            if enabled:
+                gc.enable()
+
+    def __load(self, data):
+        """create the records, without garbage collection passes"""
+        tree = self.tree
+        self.date, self.time, display_name, lang, places, notes, sources = data[:7]
+        if not tree.display_name or not tree.lang:
+            tree.display_name = tree.display_name or display_name
+            tree.lang = tree.lang or lang
+        for key, value in places.items():
+            tree.places.setdefault(key, value)
+        self.notes = [Note(text, num=num) for num, text in notes]
+        tree.add_notes(self.notes)
+        self.sources = list()
+        self.sour = dict()
+        for num, fid, title, citation, url, source_notes in sources:
+            source = Source(num=num)
+            source.tree = tree
+            source.fid = fid
+            source.title = title
+            source.citation = citation
+            source.url = url
+            source.notes = {self.notes[i] for i in source_notes}
+            self.sources.append(tree.sources.setdefault(fid, source))
+            self.sour[num] = self.sources[-1]
+        self.indi = dict()
+        self.fam = dict()
+        families = dict()
+        for row in data[8]:
+            fam = Fam(row[1], row[2], tree, row[0])
+            fam.fid = row[3]
+            fam.facts = {self.__fact(o) for o in row[4]}
+            fam.chil_fid = set(row[6])
+            self.__links(fam, row[7], row[8])
+            self.fam[fam.num] = families[(fam.husb_fid, fam.wife_fid)] = fam
+        for row in data[7]:
+            indi = Indi(row[1], tree, row[0])
+            indi.gender, indi.living = row[2], row[3]
+            indi.name = self.__name(row[4])
+            indi.nicknames = {self.__name(o) for o in row[5]}
+            indi.birthnames = {self.__name(o) for o in row[6]}
+            indi.aka = {self.__name(o) for o in row[7]}
+            indi.married = {self.__name(o) for o in row[8]}
+            indi.facts = {self.__fact(o) for o in row[9]}
+            for description, url in row[10]:
+                memorie = Memorie()
+                memorie.description, memorie.url = description, url
+                indi.memories.add(memorie)
+            for attr, o in zip(INDI_ORDINANCES, row[11]):
+                setattr(indi, attr, self.__ordinance(o, families))
+            indi.famc_fid = set(map(tuple, row[12]))
+            indi.fams_fid = set(map(tuple, row[13]))
+            indi.parents = set(map(tuple, row[14]))
+            indi.spouses = set(map(tuple, row[15]))
+            indi.children = set(map(tuple, row[16]))
+            self.__links(indi, row[17], row[18])
+            self.indi[indi.num] = indi
+        for fam, row in zip(self.fam.values(), data[8]):
+            fam.sealing_spouse = self.__ordinance(row[5], families)
+
+    def __links(self, record, notes, sources):
+        record.notes = {self.notes[i] for i in notes}
+        record.sources = {(self.sources[i], page) for i, page in sources}
+
+    def __name(self, row):
+        if row is None:
+            return None
+        name = Name()
+        name.given, name.surname, name.prefix, name.suffix, note = row
+        name.note = self.notes[note] if note is not None else None
+        return name
+
+    def __fact(self, row):
+        fact = Fact()
+        fact.type, fact.value, fact.date, fact.place, fact.map, note = row
+        fact.note = self.notes[note] if note is not None else None
+        return fact
+
+    @staticmethod
+    def __ordinance(row, families):
+        if row is None:
+            return None
+        ordinance = Ordinance()
+        ordinance.date, ordinance.temple_code, ordinance.status, famc = row
+        ordinance.famc = families.get(tuple(famc)) if famc else None
+        return ordinance
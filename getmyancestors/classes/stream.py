@@ -0,0 +1,158 @@
+# global imports
+import io
+import mmap
+import tempfile
+import threading
+
+# local imports
+from getmyancestors.classes.writer import Writer
+
+
+class Spilled:
+    """A record printed to the spill file of a Stream
+    :param stream: the Stream object
+    :param num: the GEDCOM identifier of the record
+    :param start: offset of the text of the record in the spill file
+    :param middle: offset of the end of the data of an individual, the rest
+                   of its text coming after its family links
+    :param end: offset of the end of the text of the record
+    :param indi: the released Indi object, printing the family links
+    """
+
+    def __init__(self, stream, num, start, middle, end, indi=None):
+        self.stream = stream
+        self.num = num
+        self.start = start
+        self.middle = middle
+        self.end = end
+        self.indi = indi
+
+    def print(self, file):
+        """print the record from the spill file"""
+        data = self.stream.data
+        file.write(data[self.start : self.middle].decode("utf-8"))
+        if self.indi:
+            self.indi.print_links(file)
+        file.write(data[self.middle : self.end].decode("utf-8"))
+
+
+class Stream:
+    """Spill individuals to a temporary file as soon as they are complete
+    An individual is complete once its notes, ordinances and contributors
+    requests have run. It is then printed to the spill file with the notes
+    it links, and released from the tree, during the crawl. Its sealing to
+    parents and families are only known once the crawl is over: they are
+    kept and printed by close, which writes all the records to the GEDCOM
+    file in the same order as Tree.print.
+    :param tree: a Tree object
+    :param file: the output file
+    :param buffer_size: number of characters buffered before writing
+    """
+
+    def __init__(self, tree, file, buffer_size=None):
+        self.tree = tree
+        self.writer = Writer(file, buffer_size)
+        self.spill = tempfile.TemporaryFile()
+        self.size = 0
+        self.data = None
+        self.indi = dict()
+        self.notes = dict()
+        self.released = 0
+        self.pending = dict()
+        self.lock = threading.Lock()
+        tree.print_head(self.writer)
+
+    def add(self, indi):
+        """count a request queued for an individual"""
+        with self.lock:
+            self.pending[indi.fid] = self.pending.get(indi.fid, 0) + 1
+
+    def done(self, indi):
+        """count a finished request, spill the individual if complete"""
+        with self.lock:
+            self.pending[indi.fid] -= 1
+            if not self.pending[indi.fid]:
+                del self.pending[indi.fid]
+                self.__spill(indi)
+
+    def __write(self, print_func):
+        """print to the spill file, return the offset of the end"""
+        text = io.StringIO()
+        print_func(text)
+        data = text.getvalue().encode("utf-8")
+        self.spill.write(data)
+        self.size += len(data)
+        return self.size
+
+    def __spill(self, indi):
+        """spill an individual and its notes, to call with the lock"""
+        if indi.fid in self.indi:
+            return
+        start = self.size
+        middle = self.__write(indi.print_data)
+        end = self.__write(indi.print_refs)
+        self.indi[indi.fid] = Spilled(self, indi.num, start, middle, end, indi)
+        names = (indi.name, *indi.nicknames, *indi.birthnames, *indi.aka)
+        notes = set(indi.notes)
+        for o in (*names, *indi.married, *indi.facts):
+            if o and o.note:
+                notes.add(o.note)
+        for note in notes:
+            if note.num not in self.notes:
+                start = self.size
+                end = self.__write(note.print)
+                self.notes[note.num] = Spilled(self, note.num, start, end, end)
+                self.__release(note)
+        indi.release()
+
+    def __release(self, note):
+        """remove a spilled Note from the tree, to call with the lock
+        Shared notes stay in the index of get_note, so that they are still
+        written once. The list of notes is rebuilt once half of its notes
+        are spilled.
+        """
+        with self.tree.notes_lock:
+            if not note.shared and self.tree.note_index.get(note.text) is note:
+                del self.tree.note_index[note.text]
+            self.released += 1
+            if 2 * self.released > len(self.tree.notes):
+                self.__compact()
+
+    def __compact(self):
+        """drop the spilled notes from the list of notes of the tree"""
+        self.tree.notes = [n for n in self.tree.notes if n.num not in self.notes]
+        self.released = 0
+
+    def close(self, processes=None):
+        """write the records and the GEDCOM trailer, by GEDCOM identifier
+        :param processes: number of worker processes printing the records
+        :return: the Writer used, with the number of bytes written
+        """
+        if self.tree.refresh:
+            self.tree.refresh.finish()
+        with self.lock:
+            with self.tree.notes_lock:
+                self.__compact()
+            self.tree.reset_num()
+            records = sorted(
+                (self.indi.get(indi.fid, indi) for indi in self.tree.indi.values()),
+                key=lambda x: x.num,
+            )
+            records += sorted(self.tree.fam.values(), key=lambda x: x.num)
+            records += sorted(self.tree.sources.values(), key=lambda x: x.num)
+            records += sorted(
+                [*self.notes.values(), *self.tree.notes], key=lambda x: x.num
+            )
+            self.spill.flush()
+            if self.size:
+                self.data = mmap.mmap(self.spill.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                self.writer.write_records(records, processes)
+            finally:
+                if self.data:
+                    self.data.close()
+                    self.data = None
+                self.spill.close()
+            self.tree.print_trailer(self.writer)
+            self.writer.flush()
+        return self.writer
@@ -1,7 +1,10 @@
-import sys
+import io
 import re
+import sys
 import time
-import asyncio
+import hashlib
+import threading
+from bisect import bisect_right
 from urllib.parse import unquote
 
 # global imports
@@ -9,6 +12,9 @@ import babelfish
 
 # local imports
 import getmyancestors
+from getmyancestors.classes.budget import Budget
+from getmyancestors.classes.runtime import Runtime
+from getmyancestors.classes.writer import Writer
 from getmyancestors.classes.constants import (
     MAX_PERSONS,
     FACT_EVEN,
@@ -16,28 +22,102 @@ from getmyancestors.classes.constants import (
     ORDINANCES_STATUS,
 )
 
+# lock of the class counters allocating the GEDCOM identifiers
+counter_lock = threading.Lock()
+
 
 # getmyancestors classes and functions
+def new_num(cls):
+    """allocate the next GEDCOM identifier of a record class
+    :param cls: Note, Source, Indi or Fam
+    """
+    with counter_lock:
+        cls.counter += 1
+        return cls.counter
+
+
+def stable_num(key, taken):
+    """return a GEDCOM identifier derived from a key, not in taken
+    FamilySearch ids are read as base 36 numbers, other keys are hashed.
+    Collisions are resolved by taking the next free number.
+    """
+    if re.fullmatch("[0-9A-Z]{1,4}(-[0-9A-Z]{1,4}){0,2}", key or ""):
+        num = int(key.replace("-", ""), 36)
+    else:
+        num = int(hashlib.sha1((key or "").encode("utf-8")).hexdigest()[:10], 16)
+    while num in taken or not num:
+        num += 1
+    taken.add(num)
+    return num
+
+
+def source_order(link):
+    """sort key of a (Source, page) link"""
+    return link[0].num, link[1] or ""
+
+
+def ordered(objects, stable, key=None):
+    """return a set sorted for stable outputs, or unchanged"""
+    return sorted(objects, key=key) if stable else objects
+
+
+def print_all(objects, file, stable, *args):
+    """print records, in the order of their GEDCOM lines for stable outputs"""
+    if not stable:
+        for o in objects:
+            o.print(file, *args)
+        return
+    texts = list()
+    for o in objects:
+        text = io.StringIO()
+        o.print(text, *args)
+        texts.append(text.getvalue())
+    file.write("".join(sorted(texts)))
+
+
+# characters splitting lines for str.splitlines
+LINE_BREAKS = re.compile("[\n\r\x0b\x0c\x1c\x1d\x1e\x85\u2028\u2029]")
+
+
 def cont(string):
-    """parse a GEDCOM line adding CONT and CONT tags if necessary"""
+    """parse a GEDCOM line adding CONT and CONC tags if necessary"""
+    # a short line without line breaks is left as is (at most 4 bytes by char)
+    if (len(string) <= 63 or len(string) <= 255 and string.isascii()) and (
+        not LINE_BREAKS.search(string)
+    ):
+        return string + "\n"
     level = int(string[:1]) + 1
-    lines = string.splitlines()
     res = list()
     max_len = 255
-    for line in lines:
-        c_line = line
+    for line in string.splitlines():
+        data = line.encode("utf-8")
+        if len(data) <= max_len:
+            res.append(line)
+            max_len = 248
+            continue
+        # byte offset of each character, found in one pass on the UTF-8 bytes
+        if len(data) == len(line):
+            offsets = range(len(line) + 1)
+        else:
+            offsets = [i for i, b in enumerate(data) if b & 0xC0 != 0x80]
+            offsets.append(len(data))
         to_conc = list()
-        while len(c_line.encode("utf-8")) > max_len:
-            index = min(max_len, len(c_line) - 2)
-            while (
-                len(c_line[:index].encode("utf-8")) > max_len
-                or re.search(r"[ \t\v]", c_line[index - 1 : index + 1])
-            ) and index > 1:
+        start = 0
+        while offsets[-1] - offsets[start] > max_len:
+            index = min(
+                max_len,
+                len(line) - start - 2,
+                bisect_right(offsets, offsets[start] + max_len) - 1 - start,
+            )
+            index = max(index, 1)
+            while index > 1 and (
+                line[start + index - 1] in " \t" or line[start + index] in " \t"
+            ):
                 index -= 1
-            to_conc.append(c_line[:index])
-            c_line = c_line[index:]
+            to_conc.append(line[start : start + index])
+            start += index
             max_len = 248
-        to_conc.append(c_line)
+        to_conc.append(line[start:])
         res.append(("\n%s CONC " % level).join(to_conc))
         max_len = 248
     return ("\n%s CONT " % level).join(res) + "\n"
@@ -52,16 +132,18 @@ class Note:
 
     counter = 0
 
+    # True for the notes returned by Tree.get_note, linked by several records
+    shared = False
+
     def __init__(self, text="", tree=None, num=None):
         if num:
             self.num = num
         else:
-            Note.counter += 1
-            self.num = Note.counter
+            self.num = new_num(Note)
         self.text = text.strip()
 
         if tree:
-            tree.notes.append(self)
+            tree.add_note(self)
 
     def print(self, file=sys.stdout):
         """print Note in GEDCOM format"""
@@ -85,8 +167,7 @@ class Source:
         if num:
             self.num = num
         else:
-            Source.counter += 1
-            self.num = Source.counter
+            self.num = new_num(Source)
 
         self.tree = tree
         self.url = self.citation = self.title = self.fid = None
@@ -116,7 +197,8 @@ class Source:
             file.write(cont("1 AUTH " + self.citation))
         if self.url:
             file.write(cont("1 PUBL " + self.url))
-        for n in self.notes:
+        stable = getattr(self.tree, "stable", False)
+        for n in ordered(self.notes, stable, lambda x: x.num):
             n.link(file, 1)
         file.write("1 REFN %s\n" % self.fid)
 
@@ -158,6 +240,16 @@ class Fact:
             ):
                 self.value = "Y"
 
+    def __key(self):
+        """the values identifying a Fact, its note excluded"""
+        return (self.type, self.value, self.date, self.place, self.map)
+
+    def __eq__(self, other):
+        return isinstance(other, Fact) and self.__key() == other.__key()
+
+    def __hash__(self):
+        return hash(self.__key())
+
     def print(self, file=sys.stdout):
         """print Fact in GEDCOM format
         the GEDCOM TAG depends on the type, defined in FACT_TAGS
@@ -200,6 +292,16 @@ class Memorie:
                     "" if not self.description else self.description + "\n"
                 ) + data["descriptions"][0]["value"]
 
+    def __key(self):
+        """the values identifying a Memorie"""
+        return (self.description, self.url)
+
+    def __eq__(self, other):
+        return isinstance(other, Memorie) and self.__key() == other.__key()
+
+    def __hash__(self):
+        return hash(self.__key())
+
     def print(self, file=sys.stdout):
         """print Memorie in GEDCOM format"""
         file.write("1 OBJE\n2 FORM URL\n")
@@ -235,6 +337,16 @@ class Name:
             if "changeMessage" in data["attribution"]:
                 self.note = Note(data["attribution"]["changeMessage"], tree)
 
+    def __key(self):
+        """the values identifying a Name, its note excluded"""
+        return (self.given, self.surname, self.prefix, self.suffix)
+
+    def __eq__(self, other):
+        return isinstance(other, Name) and self.__key() == other.__key()
+
+    def __hash__(self):
+        return hash(self.__key())
+
     def print(self, file=sys.stdout, typ=None):
         """print Name in GEDCOM format
         :param typ: type for additional names
@@ -265,6 +377,16 @@ class Ordinance:
                 self.temple_code = data["completedTemple"]["code"]
             self.status = data["status"]
 
+    def __key(self):
+        """the values identifying an Ordinance"""
+        return (self.date, self.temple_code, self.status, self.famc)
+
+    def __eq__(self, other):
+        return isinstance(other, Ordinance) and self.__key() == other.__key()
+
+    def __hash__(self):
+        return hash(self.__key())
+
     def print(self, file=sys.stdout):
         """print Ordinance in Gecom format"""
         if self.date:
@@ -290,8 +412,7 @@ class Indi:
         if num:
             self.num = num
         else:
-            Indi.counter += 1
-            self.num = Indi.counter
+            self.num = new_num(Indi)
         self.fid = fid
         self.tree = tree
         self.famc_fid = set()
@@ -319,6 +440,10 @@ class Indi:
         """add FS individual data"""
         if data:
             self.living = data["living"]
+            if self.tree.refresh and self.tree.refresh.carry_indi(self):
+                if self.tree.pipeline:
+                    self.tree.pipeline.add_carried(self)
+                return
             for x in data["names"]:
                 if x["preferred"]:
                     self.name = Name(x, self.tree)
@@ -350,7 +475,7 @@ class Indi:
                         )
                     else:
                         self.facts.add(Fact(x, self.tree))
-            if "sources" in data:
+            if "sources" in data and self.tree.budget.enrich():
                 sources = self.tree.fs.get_url(
                     "/platform/tree/persons/%s/sources" % self.fid
                 )
@@ -363,12 +488,12 @@ class Indi:
                             else None
                         )
                     for source in sources["sourceDescriptions"]:
-                        if source["id"] not in self.tree.sources:
-                            self.tree.sources[source["id"]] = Source(source, self.tree)
                         self.sources.add(
-                            (self.tree.sources[source["id"]], quotes[source["id"]])
+                            (self.tree.add_source(source), quotes[source["id"]])
                         )
             for evidence in data.get("evidence", []):
+                if not self.tree.budget.enrich():
+                    break
                 memory_id, *_ = evidence["id"].partition("-")
                 url = "/platform/memories/memories/%s" % memory_id
                 memorie = self.tree.fs.get_url(url)
@@ -383,6 +508,8 @@ class Indi:
                             self.notes.add(Note(text, self.tree))
                         else:
                             self.memories.add(Memorie(x))
+            if self.tree.pipeline:
+                self.tree.pipeline.add_indi(self)
 
     def add_fams(self, fams):
         """add family fid (for spouse or parent)"""
@@ -401,6 +528,23 @@ class Indi:
                 text_note += n["text"] + "\n" if "text" in n else ""
                 self.notes.add(Note(text_note, self.tree))
 
+    def release(self):
+        """drop the data of an individual already printed
+        only the identifiers used by the families and the sealing to
+        parents, printed with the families, are kept
+        """
+        self.name = self.gender = None
+        self.baptism = self.confirmation = self.initiatory = None
+        self.endowment = None
+        self.nicknames = set()
+        self.facts = set()
+        self.birthnames = set()
+        self.married = set()
+        self.aka = set()
+        self.notes = set()
+        self.sources = set()
+        self.memories = set()
+
     def get_ordinances(self):
         """retrieve LDS ordinances
         need a LDS account
@@ -447,31 +591,29 @@ class Indi:
                 self.tree.fs._("Contributors"),
                 "\n".join(sorted(temp)),
             )
-            for n in self.tree.notes:
-                if n.text == text:
-                    self.notes.add(n)
-                    return
-            self.notes.add(Note(text, self.tree))
+            self.notes.add(self.tree.get_note(text))
 
     def print(self, file=sys.stdout):
         """print individual in GEDCOM format"""
+        self.print_data(file)
+        self.print_links(file)
+        self.print_refs(file)
+
+    def print_data(self, file=sys.stdout):
+        """print the names, facts and ordinances of the individual"""
+        stable = getattr(self.tree, "stable", False)
         file.write("0 @I%s@ INDI\n" % self.num)
         if self.name:
             self.name.print(file)
-        for o in self.nicknames:
+        for o in ordered(self.nicknames, stable, lambda x: (x.given, x.surname)):
             file.write(cont("2 NICK %s %s" % (o.given, o.surname)))
-        for o in self.birthnames:
-            o.print(file)
-        for o in self.aka:
-            o.print(file, "aka")
-        for o in self.married:
-            o.print(file, "married")
+        print_all(self.birthnames, file, stable)
+        print_all(self.aka, file, stable, "aka")
+        print_all(self.married, file, stable, "married")
         if self.gender:
             file.write("1 SEX %s\n" % self.gender)
-        for o in self.facts:
-            o.print(file)
-        for o in self.memories:
-            o.print(file)
+        print_all(self.facts, file, stable)
+        print_all(self.memories, file, stable)
         if self.baptism:
             file.write("1 BAPL\n")
             self.baptism.print(file)
@@ -484,17 +626,26 @@ class Indi:
         if self.endowment:
             file.write("1 ENDL\n")
             self.endowment.print(file)
+
+    def print_links(self, file=sys.stdout):
+        """print the sealing to parents and the families of the individual,
+        known once the crawl is over"""
+        stable = getattr(self.tree, "stable", False)
         if self.sealing_child:
             file.write("1 SLGC\n")
             self.sealing_child.print(file)
-        for num in self.fams_num:
+        for num in ordered(self.fams_num, stable):
             file.write("1 FAMS @F%s@\n" % num)
-        for num in self.famc_num:
+        for num in ordered(self.famc_num, stable):
             file.write("1 FAMC @F%s@\n" % num)
+
+    def print_refs(self, file=sys.stdout):
+        """print the id, the notes and the sources of the individual"""
+        stable = getattr(self.tree, "stable", False)
         file.write("1 _FSFTID %s\n" % self.fid)
-        for o in self.notes:
+        for o in ordered(self.notes, stable, lambda x: x.num):
             o.link(file)
-        for source, quote in self.sources:
+        for source, quote in ordered(self.sources, stable, source_order):
             source.link(file, 1)
             if quote:
                 file.write(cont("2 PAGE " + quote))
@@ -514,8 +665,7 @@ class Fam:
         if num:
             self.num = num
         else:
-            Fam.counter += 1
-            self.num = Fam.counter
+            self.num = new_num(Fam)
         self.husb_fid = husb if husb else None
         self.wife_fid = wife if wife else None
         self.tree = tree
@@ -538,6 +688,10 @@ class Fam:
         """
         if not self.fid:
             self.fid = fid
+            if self.tree.refresh and self.tree.refresh.carry_fam(self):
+                return
+            if not self.tree.budget.enrich():
+                return
             url = "/platform/tree/couple-relationships/%s" % self.fid
             data = self.tree.fs.get_url(url)
             if data:
@@ -552,23 +706,21 @@ class Fam:
                             if "changeMessage" in x["attribution"]
                             else None
                         )
-                    new_sources = quotes.keys() - self.tree.sources.keys()
+                    with self.tree.sources_lock:
+                        new_sources = quotes.keys() - self.tree.sources.keys()
                     if new_sources:
                         sources = self.tree.fs.get_url(
                             "/platform/tree/couple-relationships/%s/sources" % self.fid
                         )
                         for source in sources["sourceDescriptions"]:
-                            if (
-                                source["id"] in new_sources
-                                and source["id"] not in self.tree.sources
-                            ):
-                                self.tree.sources[source["id"]] = Source(
-                                    source, self.tree
-                                )
+                            if source["id"] in new_sources:
+                                self.tree.add_source(source)
                     for source_fid in quotes:
                         self.sources.add(
                             (self.tree.sources[source_fid], quotes[source_fid])
                         )
+            if self.tree.pipeline:
+                self.tree.pipeline.add_fam(self)
 
     def get_notes(self):
         """retrieve marriage notes"""
@@ -599,31 +751,27 @@ class Fam:
                     self.tree.fs._("Contributors"),
                     "\n".join(sorted(temp)),
                 )
-                for n in self.tree.notes:
-                    if n.text == text:
-                        self.notes.add(n)
-                        return
-                self.notes.add(Note(text, self.tree))
+                self.notes.add(self.tree.get_note(text))
 
     def print(self, file=sys.stdout):
         """print family information in GEDCOM format"""
+        stable = getattr(self.tree, "stable", False)
         file.write("0 @F%s@ FAM\n" % self.num)
         if self.husb_num:
             file.write("1 HUSB @I%s@\n" % self.husb_num)
         if self.wife_num:
             file.write("1 WIFE @I%s@\n" % self.wife_num)
-        for num in self.chil_num:
+        for num in ordered(self.chil_num, stable):
             file.write("1 CHIL @I%s@\n" % num)
-        for o in self.facts:
-            o.print(file)
+        print_all(self.facts, file, stable)
         if self.sealing_spouse:
             file.write("1 SLGS\n")
             self.sealing_spouse.print(file)
         if self.fid:
             file.write("1 _FSFTID %s\n" % self.fid)
-        for o in self.notes:
+        for o in ordered(self.notes, stable, lambda x: x.num):
             o.link(file)
-        for source, quote in self.sources:
+        for source, quote in ordered(self.sources, stable, source_order):
             source.link(file, 1)
             if quote:
                 file.write(cont("2 PAGE " + quote))
@@ -631,21 +779,192 @@ class Fam:
 
 class Tree:
     """family tree class
+    The crawl adds records from the executor threads: indi, fam and places are
+    only written by the thread running the event loop, notes and sources are
+    written through add_note, get_note and add_source under their own locks,
+    and GEDCOM identifiers are allocated by new_num.
     :param fs: a Session object
+    :param budget: a Budget object limiting the download
+    :param runtime: a Runtime object running the requests
     """
 
-    def __init__(self, fs=None):
+    def __init__(self, fs=None, budget=None, runtime=None):
         self.fs = fs
+        self.runtime = runtime
+        self.budget = budget or Budget(fs)
+        self.distance = dict()
         self.indi = dict()
         self.fam = dict()
         self.notes = list()
+        self.note_index = dict()
+        self.notes_lock = threading.RLock()
         self.sources = dict()
+        self.sources_lock = threading.RLock()
+        self.merged_sources = set()
+        self.merged_notes = dict()
         self.places = dict()
+        self.refresh = None
+        self.pipeline = None
         self.display_name = self.lang = None
+        self.stable = False
         if fs:
             self.display_name = fs.display_name
             self.lang = babelfish.Language.fromalpha2(fs.lang).name
 
+    def add_note(self, note):
+        """add a Note to the tree"""
+        with self.notes_lock:
+            self.notes.append(note)
+            self.note_index.setdefault(note.text, note)
+
+    def add_notes(self, notes):
+        """add a list of Notes to the tree"""
+        with self.notes_lock:
+            self.notes += notes
+            for note in notes:
+                self.note_index.setdefault(note.text, note)
+
+    def get_note(self, text):
+        """return a Note with this text, created if needed"""
+        with self.notes_lock:
+            note = self.note_index.get(text.strip())
+            if not (note and note.text == text.strip()):
+                note = Note(text, self)
+            note.shared = True
+            return note
+
+    def merge(self, ged):
+        """merge the records of a GEDCOM file into the tree
+        Individuals are matched by fid and families by the fids of the
+        spouses, new ones are numbered after the records of the tree. The
+        file wins over the tree, except for the families of individuals
+        and the children of families which are merged, the sealing to
+        parents linked to a family and the family data missing in the file.
+        Sources are matched by fid, the sources added by the file are
+        numbered after the sources of the tree. Notes are matched by text:
+        only the notes added to the tree since the last merge and the links
+        of the records of the file are visited, so the cost of a merge is
+        proportional to the file, not to the tree.
+        :param ged: a Gedcom object parsed or attached into this tree
+        """
+        for record in (*ged.indi.values(), *ged.fam.values()):
+            record.sources = {
+                (self.sources.get(source.fid, source), page)
+                for source, page in record.sources
+            }
+        for source in ged.sour.values():
+            fid = source.fid
+            if fid in self.sources and fid not in self.merged_sources:
+                self.merged_sources.add(fid)
+                self.sources[fid].num = new_num(Source)
+                self.sources[fid].tree = self
+        self.__merge_notes(ged)
+        for indi in ged.indi.values():
+            fid = indi.fid
+            if fid not in self.indi:
+                self.indi[fid] = Indi(fid, self)
+            merged = self.indi[fid]
+            merged.fams_fid |= indi.fams_fid
+            merged.famc_fid |= indi.famc_fid
+            merged.name = indi.name
+            merged.birthnames = indi.birthnames
+            merged.nicknames = indi.nicknames
+            merged.aka = indi.aka
+            merged.married = indi.married
+            merged.gender = indi.gender
+            merged.facts = indi.facts
+            merged.notes = indi.notes
+            merged.sources = indi.sources
+            merged.memories = indi.memories
+            merged.baptism = indi.baptism
+            merged.confirmation = indi.confirmation
+            merged.initiatory = indi.initiatory
+            merged.endowment = indi.endowment
+            if not (merged.sealing_child and merged.sealing_child.famc):
+                merged.sealing_child = indi.sealing_child
+        for fam in ged.fam.values():
+            husb, wife = fam.husb_fid, fam.wife_fid
+            if (husb, wife) not in self.fam:
+                self.fam[(husb, wife)] = Fam(husb, wife, self)
+            merged = self.fam[(husb, wife)]
+            merged.chil_fid |= fam.chil_fid
+            if fam.fid:
+                merged.fid = fam.fid
+            if fam.facts:
+                merged.facts = fam.facts
+            if fam.notes:
+                merged.notes = fam.notes
+            if fam.sources:
+                merged.sources = fam.sources
+            merged.sealing_spouse = fam.sealing_spouse
+
+    def __merge_notes(self, ged):
+        """keep one Note by text for the notes added by a merged file
+        The notes kept by the previous merges are the first notes of the
+        tree, indexed by text in merged_notes.
+        """
+        index = self.merged_notes
+        with self.notes_lock:
+            start = len(index)
+            added = list()
+            for note in self.notes[start:]:
+                if note.text not in index:
+                    note.num = new_num(Note)
+                    index[note.text] = note
+                    added.append(note)
+            self.notes[start:] = added
+        for indi in ged.indi.values():
+            names = (indi.name, *indi.birthnames, *indi.nicknames, *indi.aka)
+            for o in (*names, *indi.married, *indi.facts):
+                if o and o.note:
+                    o.note = index.get(o.note.text, o.note)
+        for fam in ged.fam.values():
+            for o in fam.facts:
+                if o.note:
+                    o.note = index.get(o.note.text, o.note)
+        for record in (*ged.indi.values(), *ged.fam.values(), *ged.sour.values()):
+            record.notes = {index.get(note.text, note) for note in record.notes}
+
+    def merge_notes(self):
+        """keep one Note by text, replace the others in the records and
+        number the notes in order
+        """
+        with self.notes_lock:
+            index = dict()
+            for note in self.notes:
+                index.setdefault(note.text, note)
+            self.notes = list(index.values())
+            self.note_index = index
+            self.merged_notes = dict(index)
+            for i, note in enumerate(self.notes, 1):
+                note.num = i
+        for indi in self.indi.values():
+            names = (indi.name, *indi.birthnames, *indi.nicknames, *indi.aka)
+            for o in (*names, *indi.married, *indi.facts):
+                if o and o.note:
+                    o.note = index[o.note.text]
+        for fam in self.fam.values():
+            for o in fam.facts:
+                if o.note:
+                    o.note = index[o.note.text]
+        for record in (*self.indi.values(), *self.fam.values(), *self.sources.values()):
+            record.notes = {index[note.text] for note in record.notes}
+
+    def add_source(self, data):
+        """return the Source of FS data, created if needed
+        :param data: FS Source data
+        """
+        with self.sources_lock:
+            if data["id"] not in self.sources:
+                self.sources[data["id"]] = Source(data, self)
+            return self.sources[data["id"]]
+
+    def get_runtime(self):
+        """return the Runtime, created on first use"""
+        if not self.runtime:
+            self.runtime = Runtime()
+        return self.runtime
+
     def add_indis(self, fids):
         """add individuals to the family tree
         :param fids: an iterable of fid
@@ -656,15 +975,17 @@ class Tree:
             for person in data["persons"]:
                 self.indi[person["id"]] = Indi(person["id"], self)
                 futures.add(
-                    loop.run_in_executor(None, self.indi[person["id"]].add_data, person)
+                    loop.run_in_executor(
+                        runtime.executor, self.indi[person["id"]].add_data, person
+                    )
                 )
             for future in futures:
                 await future
 
         new_fids = [fid for fid in fids if fid and fid not in self.indi]
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        while new_fids:
+        new_fids = self.budget.select(new_fids, len(self.indi), self.distance)
+        runtime = self.get_runtime()
+        while new_fids and self.budget.crawl():
             data = self.fs.get_url(
                 "/platform/tree/persons?pids=" + ",".join(new_fids[:MAX_PERSONS])
             )
@@ -676,7 +997,7 @@ class Tree:
                                 str(place["latitude"]),
                                 str(place["longitude"]),
                             )
-                loop.run_until_complete(add_datas(loop, data))
+                runtime.run(add_datas(runtime.loop, data))
                 if "childAndParentsRelationships" in data:
                     for rel in data["childAndParentsRelationships"]:
                         father = (
@@ -708,6 +1029,15 @@ class Tree:
                                 )
             new_fids = new_fids[MAX_PERSONS:]
 
+    def add_distance(self, fids, fid):
+        """record the number of generations from the starting individuals
+        :param fids: an iterable of fid related to fid
+        :param fid: a downloaded fid
+        """
+        for new_fid in fids:
+            if new_fid and new_fid not in self.indi and new_fid not in self.distance:
+                self.distance[new_fid] = self.distance.get(fid, 0) + 1
+
     def add_fam(self, father, mother):
         """add a family to the family tree
         :param father: the father fid or None
@@ -739,6 +1069,7 @@ class Tree:
         for fid in fids & self.indi.keys():
             for couple in self.indi[fid].parents:
                 parents |= set(couple)
+                self.add_distance(couple, fid)
         if parents:
             self.add_indis(parents)
         for fid in fids & self.indi.keys():
@@ -765,7 +1096,9 @@ class Tree:
                 if (father, mother) in self.fam:
                     futures.add(
                         loop.run_in_executor(
-                            None, self.fam[(father, mother)].add_marriage, relfid
+                            runtime.executor,
+                            self.fam[(father, mother)].add_marriage,
+                            relfid,
                         )
                     )
             for future in futures:
@@ -774,7 +1107,9 @@ class Tree:
         rels = set()
         for fid in fids & self.indi.keys():
             rels |= self.indi[fid].spouses
-        loop = asyncio.get_event_loop()
+            for father, mother, _ in self.indi[fid].spouses:
+                self.add_distance((father, mother), fid)
+        runtime = self.get_runtime()
         if rels:
             self.add_indis(
                 set.union(*({father, mother} for father, mother, relfid in rels))
@@ -784,7 +1119,7 @@ class Tree:
                     self.indi[father].add_fams((father, mother))
                     self.indi[mother].add_fams((father, mother))
                     self.add_fam(father, mother)
-            loop.run_until_complete(add(loop, rels))
+            runtime.run(add(runtime.loop, rels))
 
     def add_children(self, fids):
         """add children relationships
@@ -793,6 +1128,8 @@ class Tree:
         rels = set()
         for fid in fids & self.indi.keys():
             rels |= self.indi[fid].children if fid in self.indi else set()
+            for rel in self.indi[fid].children:
+                self.add_distance(rel, fid)
         children = set()
         if rels:
             self.add_indis(set.union(*(set(rel) for rel in rels)))
@@ -815,6 +1152,15 @@ class Tree:
         """
         if fid in self.indi:
             ret, famc = self.indi[fid].get_ordinances()
+            self.link_ordinances(fid, ret, famc)
+
+    def link_ordinances(self, fid, ret, famc):
+        """link LDS ordinances to the families
+        :param fid: an individual fid
+        :param ret: the sealings to spouses
+        :param famc: the parents fids of the sealing to parents
+        """
+        if fid in self.indi:
             if famc and famc in self.fam:
                 self.indi[fid].sealing_child.famc = self.fam[famc]
             for o in ret:
@@ -840,8 +1186,38 @@ class Tree:
                 self.fam[(husb, wife)].num for husb, wife in self.indi[fid].fams_fid
             )
 
-    def print(self, file=sys.stdout):
-        """print family tree in GEDCOM format"""
+    def stable_num(self):
+        """derive the GEDCOM identifiers from the FamilySearch ids, the
+        spouses of families and the text of notes, the same between runs
+        Notes with the same text are merged, records are printed in a stable
+        order. reset_num must be called after.
+        """
+        self.merge_notes()
+        self.stable = True
+        taken = set()
+        for fid in sorted(self.indi, key=lambda x: x or ""):
+            self.indi[fid].num = stable_num(fid, taken)
+        taken = set()
+        for husb, wife in sorted(self.fam, key=lambda x: (x[0] or "", x[1] or "")):
+            key = "%s+%s" % (husb or "", wife or "")
+            self.fam[(husb, wife)].num = stable_num(key, taken)
+        taken = set()
+        for fid in sorted(self.sources, key=lambda x: x or ""):
+            self.sources[fid].num = stable_num(fid, taken)
+        taken = set()
+        for note in sorted(self.notes, key=lambda x: x.text):
+            note.num = stable_num(note.text, taken)
+
+    def records(self):
+        """return the records of the tree in GEDCOM order"""
+        records = sorted(self.indi.values(), key=lambda x: x.num)
+        records += sorted(self.fam.values(), key=lambda x: x.num)
+        records += sorted(self.sources.values(), key=lambda x: x.num)
+        records += sorted(self.notes, key=lambda x: x.num)
+        return records
+
+    def print_head(self, file=sys.stdout):
+        """print the GEDCOM header"""
         file.write("0 HEAD\n")
         file.write("1 CHAR UTF-8\n")
         file.write("1 GEDC\n")
@@ -857,17 +1233,19 @@ class Tree:
         file.write("1 NAME %s\n" % self.display_name)
         file.write("1 LANG %s\n" % self.lang)
 
-        for fid in sorted(self.indi, key=lambda x: self.indi.__getitem__(x).num):
-            self.indi[fid].print(file)
-        for husb, wife in sorted(self.fam, key=lambda x: self.fam.__getitem__(x).num):
-            self.fam[(husb, wife)].print(file)
-        sources = sorted(self.sources.values(), key=lambda x: x.num)
-        for s in sources:
-            s.print(file)
-        notes = sorted(self.notes, key=lambda x: x.num)
-        for i, n in enumerate(notes):
-            if i > 0:
-                if n.num == notes[i - 1].num:
-                    continue
-            n.print(file)
+    def print_trailer(self, file=sys.stdout):
+        """print the GEDCOM trailer"""
         file.write("0 TRLR\n")
+
+    def print(self, file=sys.stdout, buffer_size=None, processes=None):
+        """print family tree in GEDCOM format
+        :param buffer_size: number of characters buffered before writing
+        :param processes: number of worker processes printing the records
+        :return: the Writer used, with the number of bytes written
+        """
+        file = Writer(file, buffer_size)
+        self.print_head(file)
+        file.write_records(self.records(), processes)
+        self.print_trailer(file)
+        file.flush()
+        return file
@@ -0,0 +1,104 @@
+# global imports
+import io
+import sys
+import time
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+# local imports
+from getmyancestors.classes.constants import BUFFER_SIZE, PRINT_RECORDS
+
+# records printed by a worker process, set by init_worker
+records = list()
+
+
+def init_worker(shared):
+    """keep the records to print in a worker process
+    :param shared: the list of records, inherited as the process is forked
+    """
+    global records
+    records = shared
+
+
+def print_records(start, stop):
+    """print a slice of the records in a worker process
+    :return: the GEDCOM text of the records
+    """
+    file = io.StringIO()
+    for record in records[start:stop]:
+        record.print(file)
+    return file.getvalue()
+
+
+class Writer:
+    """Buffer GEDCOM text and write it to a file by large chunks
+    :param file: a text file object
+    :param buffer_size: number of characters buffered before writing
+    """
+
+    def __init__(self, file, buffer_size=None):
+        self.file = file
+        self.buffer_size = buffer_size or BUFFER_SIZE
+        self.encoding = getattr(file, "encoding", None) or "utf-8"
+        self.parts = list()
+        self.size = 0
+        self.written = 0
+        self.start = time.time()
+
+    def write(self, text):
+        """add text to the buffer"""
+        self.parts.append(text)
+        self.size += len(text)
+        if self.size >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        """write the buffer to the file"""
+        if self.parts:
+            chunk = "".join(self.parts)
+            self.file.write(chunk)
+            self.written += len(chunk.encode(self.encoding, "replace"))
+            self.parts.clear()
+            self.size = 0
+        self.file.flush()
+
+    def rate(self):
+        """return the number of bytes written by second"""
+        return self.written / max(time.time() - self.start, 1e-6)
+
+    def write_records(self, records, processes=None):
+        """print GEDCOM records, in worker processes if processes > 1
+        The records are split into consecutive slices printed by forked
+        processes, their text is written back in order so the output is
+        the same as when printed by this process. The records are given to
+        the workers by init_worker, without being pickled. Forking is only
+        safe when no other thread runs, otherwise the records are printed
+        by this process, with a warning.
+        :param records: a list of Indi, Fam, Source and Note objects
+        :param processes: number of worker processes
+        """
+        parallel = processes and processes > 1 and len(records) > PRINT_RECORDS
+        if parallel and "fork" not in multiprocessing.get_all_start_methods():
+            sys.stderr.write("Cannot fork, printing in one process\n")
+            parallel = False
+        elif parallel and threading.active_count() > 1:
+            sys.stderr.write(
+                "%s threads running, printing in one process\n"
+                % threading.active_count()
+            )
+            parallel = False
+        if not parallel:
+            for record in records:
+                record.print(self)
+            return
+        starts = range(0, len(records), PRINT_RECORDS)
+        stops = [start + PRINT_RECORDS for start in starts]
+        with ProcessPoolExecutor(
+            processes,
+            mp_context=multiprocessing.get_context("fork"),
+            initializer=init_worker,
+            initargs=(records,),
+        ) as pool:
+            for text in pool.map(print_records, starts, stops):
+                self.write(text)
@@ -0,0 +1,98 @@
+# coding: utf-8
+
+from __future__ import print_function
+
+# global imports
+import os
+import sys
+import argparse
+from collections import Counter
+
+# local imports
+from getmyancestors.classes.diff import Fingerprints, diff
+from getmyancestors.classes.compression import FileType
+
+sys.path.append(os.path.dirname(sys.argv[0]))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compare two GEDCOM files from FamilySearch Tree by "
+        "FamilySearch ids",
+        add_help=False,
+        usage="gedcomdiff old.ged new.ged [options]",
+    )
+    try:
+        parser.add_argument(
+            "old",
+            metavar="<OLD>",
+            type=FileType("r", encoding="UTF-8"),
+            help="previous GEDCOM file, compressed if ending with .gz, .xz or .zst",
+        )
+        parser.add_argument(
+            "new",
+            metavar="<NEW>",
+            type=FileType("r", encoding="UTF-8"),
+            help="new GEDCOM file, compressed if ending with .gz, .xz or .zst",
+        )
+        parser.add_argument(
+            "-o",
+            metavar="<FILE>",
+            type=argparse.FileType("w", encoding="UTF-8"),
+            default=sys.stdout,
+            help="output file [stdout]",
+        )
+        parser.add_argument(
+            "-q",
+            "--quiet",
+            action="store_true",
+            default=False,
+            help="Only list the records, without the changed lines",
+        )
+    except TypeError:
+        sys.stderr.write("Python >= 3.4 is required to run this script\n")
+        sys.stderr.write("(see https://docs.python.org/3/whatsnew/3.4.html#argparse)\n")
+        exit(2)
+
+    # extract arguments from the command line
+    try:
+        parser.error = parser.exit
+        args = parser.parse_args()
+    except SystemExit as e:
+        print(e.code)
+        parser.print_help()
+        exit(2)
+
+    old = Fingerprints(args.old)
+    new = Fingerprints(args.new)
+
+    # list the added, removed and changed individuals and families
+    counts = Counter()
+    for change, tag, key, old_record, new_record in diff(old, new):
+        counts[change, tag] += 1
+        record = new_record or old_record
+        label = " " + record.get("NAME") if tag == "INDI" and record.get("NAME") else ""
+        args.o.write("%s %s %s%s\n" % (change, tag, key, label))
+        if change != "~" or args.quiet:
+            continue
+        old_blocks = Counter(old.blocks(old_record))
+        new_blocks = Counter(new.blocks(new_record))
+        for sign, blocks in (
+            ("-", old_blocks - new_blocks),
+            ("+", new_blocks - old_blocks),
+        ):
+            for block in sorted(blocks.elements()):
+                args.o.write("  %s %s\n" % (sign, block.replace("\n", "\n    ")))
+    if args.o is not sys.stdout:
+        args.o.close()
+
+    sys.stderr.write(
+        "Individuals: %s added, %s removed, %s changed\n"
+        "Families: %s added, %s removed, %s changed\n"
+        % tuple(counts[change, tag] for tag in ("INDI", "FAM") for change in "+-~")
+    )
+    exit(1 if counts else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -7,12 +7,21 @@ import sys
 import time
 from urllib.parse import unquote
 import getpass
-import asyncio
 import argparse
 
 # local imports
 from getmyancestors.classes.tree import Tree
+from getmyancestors.classes.constants import SCHEDULER_PRIORITIES
+from getmyancestors.classes.budget import Budget
 from getmyancestors.classes.session import Session
+from getmyancestors.classes.archive import Archive, ArchiveSession
+from getmyancestors.classes.refresh import Refresh
+from getmyancestors.classes.pipeline import Pipeline
+from getmyancestors.classes.runtime import Runtime
+from getmyancestors.classes.stream import Stream
+from getmyancestors.classes.compression import FileType
+from getmyancestors.classes.export import write_jsonl, write_sqlite
+from getmyancestors.classes.snapshot import write_snapshot
 
 
 
@@ -88,6 +97,65 @@ def main():
         default=60,
         help="Timeout in seconds [60]",
     )
+    parser.add_argument(
+        "--max-requests",
+        metavar="<INT>",
+        type=int,
+        help="Maximum number of HTTP requests [unlimited]",
+    )
+    parser.add_argument(
+        "--max-persons",
+        metavar="<INT>",
+        type=int,
+        help="Maximum number of individuals [unlimited]",
+    )
+    parser.add_argument(
+        "--deadline",
+        metavar="<INT>",
+        type=int,
+        help="Maximum duration of the download in seconds [unlimited]",
+    )
+    parser.add_argument(
+        "--workers",
+        metavar="<INT>",
+        type=int,
+        help="Number of concurrent HTTP requests [number of CPUs + 4, max 32]",
+    )
+    parser.add_argument(
+        "--limits",
+        metavar="<KIND=INT>",
+        nargs="+",
+        type=str,
+        default=[],
+        help="Concurrent requests by kind (notes, ordinances, contributors), "
+        "e.g. contributors=2 [no limit]",
+    )
+    parser.add_argument(
+        "--buffer-size",
+        metavar="<INT>",
+        type=int,
+        help="Number of characters buffered before writing the GEDCOM file [1048576]",
+    )
+    parser.add_argument(
+        "--processes",
+        metavar="<INT>",
+        type=int,
+        help="Number of processes writing the GEDCOM file [1]",
+    )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        default=False,
+        help="Write individuals to a temporary file during the download, "
+        "to keep memory usage low [False]",
+    )
+    parser.add_argument(
+        "--stable-ids",
+        action="store_true",
+        default=False,
+        help="Derive the GEDCOM identifiers from FamilySearch ids and contents, "
+        "unchanged between runs [False]",
+    )
     parser.add_argument(
         "--show-password",
         action="store_true",
@@ -104,9 +172,29 @@ def main():
         "-o",
         "--outfile",
         metavar="<FILE>",
-        type=argparse.FileType("w", encoding="UTF-8"),
+        type=FileType("w", encoding="UTF-8"),
         default=sys.stdout,
-        help="output GEDCOM file [stdout]",
+        help="output GEDCOM file, compressed if ending with .gz, .xz or .zst "
+        "[stdout]",
+    )
+    parser.add_argument(
+        "--jsonl",
+        metavar="<FILE>",
+        type=FileType("w", encoding="UTF-8"),
+        help="Also write the tree in JSON Lines format, one record by line",
+    )
+    parser.add_argument(
+        "--sqlite",
+        metavar="<FILE>",
+        type=str,
+        help="Also write the tree in a SQLite database",
+    )
+    parser.add_argument(
+        "--snapshot",
+        metavar="<FILE>",
+        type=str,
+        help="Also write the tree in a binary snapshot, read by --update "
+        "and mergemyancestors",
     )
     parser.add_argument(
         "-l",
@@ -116,6 +204,25 @@ def main():
         default=False,
         help="output log file [stderr]",
     )
+    parser.add_argument(
+        "--update",
+        metavar="<FILE>",
+        type=FileType("r", encoding="UTF-8"),
+        help="Previous output GEDCOM or snapshot file, only records changed since "
+        "are downloaded",
+    )
+    parser.add_argument(
+        "--archive",
+        metavar="<FILE>",
+        type=str,
+        help="Save the downloaded data in an archive file, for --rebuild",
+    )
+    parser.add_argument(
+        "--rebuild",
+        metavar="<FILE>",
+        type=str,
+        help="Build the tree from an archive file instead of downloading it",
+    )
     parser.add_argument(
         "--client_id", metavar="<STR>", type=str, help="Use Specific Client ID"
     )
@@ -130,19 +237,35 @@ def main():
     except SystemExit:
         parser.print_help(file=sys.stderr)
         sys.exit(2)
+    limits = dict()
+    for limit in args.limits:
+        kind, sep, value = limit.partition("=")
+        if kind not in SCHEDULER_PRIORITIES or not value.isdigit() or int(value) < 1:
+            sys.exit(
+                "Invalid limit: %s (kinds: %s, limits of at least 1)"
+                % (limit, ", ".join(SCHEDULER_PRIORITIES))
+            )
+        limits[kind] = int(value)
+    if args.archive and args.rebuild:
+        sys.exit("--archive cannot be used with --rebuild")
+    if args.stream and (args.jsonl or args.sqlite or args.snapshot):
+        sys.exit("--stream cannot be used with --jsonl, --sqlite or --snapshot")
+    if args.stream and args.stable_ids:
+        sys.exit("--stream cannot be used with --stable-ids")
     if args.individuals:
         for fid in args.individuals:
             if not re.match(r"[A-Z0-9]{4}-[A-Z0-9]{3}", fid):
                 sys.exit("Invalid FamilySearch ID: " + fid)
 
-    args.username = (
-        args.username if args.username else input("Enter FamilySearch username: ")
-    )
-    args.password = (
-        args.password
-        if args.password
-        else getpass.getpass("Enter FamilySearch password: ")
-    )
+    if not args.rebuild:
+        args.username = (
+            args.username if args.username else input("Enter FamilySearch username: ")
+        )
+        args.password = (
+            args.password
+            if args.password
+            else getpass.getpass("Enter FamilySearch password: ")
+        )
 
     time_count = time.time()
 
@@ -174,23 +297,42 @@ def main():
             )
 
     # initialize a FamilySearch session and a family tree object
-    print("Login to FamilySearch...", file=sys.stderr)
-    fs = Session(
-        args.username,
-        args.password,
-        args.client_id,
-        args.redirect_uri,
-        args.verbose,
-        args.logfile,
-        args.timeout,
-    )
+    if args.rebuild:
+        print("Reading archive...", file=sys.stderr)
+        fs = ArchiveSession(Archive(args.rebuild), args.verbose, args.logfile)
+    else:
+        print("Login to FamilySearch...", file=sys.stderr)
+        fs = Session(
+            args.username,
+            args.password,
+            args.client_id,
+            args.redirect_uri,
+            args.verbose,
+            args.logfile,
+            args.timeout,
+        )
     if not fs.logged:
         sys.exit(2)
+    if args.archive:
+        fs.archive = Archive(args.archive, "w")
+        fs.archive.put(
+            "session",
+            {"fid": fs.fid, "lang": fs.lang, "display_name": fs.display_name},
+        )
     _ = fs._
-    tree = Tree(fs)
+    budget = Budget(fs, args.max_requests, args.max_persons, args.deadline)
+    runtime = Runtime(args.workers, limits)
+    tree = Tree(fs, budget, runtime)
+    tree.pipeline = Pipeline(tree, args.get_ordinances, args.get_contributors)
+    if args.update:
+        print(_("Reading previous GEDCOM file..."), file=sys.stderr)
+        tree.refresh = Refresh(args.update, tree)
+    stream = None
+    if args.stream:
+        stream = tree.pipeline.stream = Stream(tree, args.outfile, args.buffer_size)
 
     # check LDS account
-    if args.get_ordinances:
+    if args.get_ordinances and not args.rebuild:
         test = fs.get_url(
             "/service/tree/tree-data/reservations/person/%s/ordinances" % fs.fid, {}, no_api=True
         )
@@ -198,6 +340,7 @@ def main():
             print("Need an LDS account")
             sys.exit(2)
 
+    joined = False
     try:
         # add list of starting individuals to the family tree
         todo = args.individuals if args.individuals else [fs.fid]
@@ -208,7 +351,7 @@ def main():
         todo = set(tree.indi.keys())
         done = set()
         for i in range(args.ascend):
-            if not todo:
+            if not todo or not budget.crawl():
                 break
             done |= todo
             print(
@@ -221,7 +364,7 @@ def main():
         todo = set(tree.indi.keys())
         done = set()
         for i in range(args.descend):
-            if not todo:
+            if not todo or not budget.crawl():
                 break
             done |= todo
             print(
@@ -231,28 +374,12 @@ def main():
             todo = tree.add_children(todo) - done
 
         # download spouses
-        if args.marriage:
+        if args.marriage and budget.crawl():
             print(_("Downloading spouses and marriage information..."), file=sys.stderr)
             todo = set(tree.indi.keys())
             tree.add_spouses(todo)
 
-        # download ordinances, notes and contributors
-        async def download_stuff(loop):
-            futures = set()
-            for fid, indi in tree.indi.items():
-                futures.add(loop.run_in_executor(None, indi.get_notes))
-                if args.get_ordinances:
-                    futures.add(loop.run_in_executor(None, tree.add_ordinances, fid))
-                if args.get_contributors:
-                    futures.add(loop.run_in_executor(None, indi.get_contributors))
-            for fam in tree.fam.values():
-                futures.add(loop.run_in_executor(None, fam.get_notes))
-                if args.get_contributors:
-                    futures.add(loop.run_in_executor(None, fam.get_contributors))
-            for future in futures:
-                await future
-
-        loop = asyncio.get_event_loop()
+        # wait for the ordinances, notes and contributors queued during the crawl
         print(
             _("Downloading notes")
             + (
@@ -264,12 +391,37 @@ def main():
             + "...",
             file=sys.stderr,
         )
-        loop.run_until_complete(download_stuff(loop))
+        tree.pipeline.join(lambda text: sys.stderr.write("\r" + text))
+        print(file=sys.stderr)
+        joined = True
 
     finally:
+        # stop the worker threads before the printing processes are forked,
+        # dropping the queued requests if interrupted or failed
+        stats = runtime.stats()
+        runtime.close(cancel=not joined)
+
         # compute number for family relationships and print GEDCOM file
-        tree.reset_num()
-        tree.print(args.outfile)
+        if stream:
+            writer = stream.close(args.processes)
+        else:
+            if tree.refresh:
+                tree.refresh.finish()
+            if args.stable_ids:
+                tree.stable_num()
+            tree.reset_num()
+            writer = tree.print(args.outfile, args.buffer_size, args.processes)
+        if args.outfile is not sys.stdout:
+            args.outfile.close()
+        if args.jsonl:
+            write_jsonl(tree, args.jsonl, args.buffer_size)
+            args.jsonl.close()
+        if args.sqlite:
+            write_sqlite(tree, args.sqlite)
+        if args.snapshot:
+            write_snapshot(tree, args.snapshot)
+        if args.archive:
+            fs.archive.close()
         print(
             _(
                 "Downloaded %s individuals, %s families, %s sources and %s notes "
@@ -279,12 +431,35 @@ def main():
                 str(len(tree.indi)),
                 str(len(tree.fam)),
                 str(len(tree.sources)),
-                str(len(tree.notes)),
+                str(len(tree.notes) + (len(stream.notes) if stream else 0)),
                 str(round(time.time() - time_count)),
                 str(fs.counter),
             ),
             file=sys.stderr,
         )
+        fs.write_log(
+            "GEDCOM: %s bytes written at %s bytes/s"
+            % (writer.written, round(writer.rate()))
+        )
+        fs.write_log(
+            "Runtime: %s/%s worker threads, %s tasks in %s seconds"
+            % (stats["threads"], stats["workers"], stats["tasks"], stats["uptime"])
+        )
+        if budget.skipped:
+            print(
+                _("Budget exhausted, %s optional requests skipped.")
+                % str(budget.skipped),
+                file=sys.stderr,
+            )
+        if tree.refresh:
+            print(
+                _("Carried over %s individuals and %s families unchanged.")
+                % (
+                    str(len(tree.refresh.carried_indi)),
+                    str(len(tree.refresh.carried_fam)),
+                ),
+                file=sys.stderr,
+            )
 
 
 if __name__ == "__main__":
@@ -5,11 +5,17 @@ from __future__ import print_function
 # global imports
 import os
 import sys
+import time
 import argparse
+from concurrent.futures import ProcessPoolExecutor
 
 # local imports
-from getmyancestors.classes.tree import Indi, Fam, Tree
-from getmyancestors.classes.gedcom import Gedcom
+from getmyancestors.classes.tree import Tree
+from getmyancestors.classes.gedcom import Gedcom, parse_file
+from getmyancestors.classes.compression import FileType
+from getmyancestors.classes.export import write_jsonl, write_sqlite
+from getmyancestors.classes.external import ExternalMerge
+from getmyancestors.classes.snapshot import Snapshot, is_snapshot, write_snapshot
 
 sys.path.append(os.path.dirname(sys.argv[0]))
 
@@ -25,17 +31,56 @@ def main():
             "-i",
             metavar="<FILE>",
             nargs="+",
-            type=argparse.FileType("r", encoding="UTF-8"),
+            type=FileType("r", encoding="UTF-8"),
             default=[sys.stdin],
-            help="input GEDCOM files [stdin]",
+            help="input GEDCOM files, compressed if ending with .gz, .xz or .zst, "
+            "or snapshot files [stdin]",
         )
         parser.add_argument(
             "-o",
             metavar="<FILE>",
             nargs="?",
-            type=argparse.FileType("w", encoding="UTF-8"),
+            type=FileType("w", encoding="UTF-8"),
             default=sys.stdout,
-            help="output GEDCOM files [stdout]",
+            help="output GEDCOM files, compressed if ending with .gz, .xz or .zst "
+            "[stdout]",
+        )
+        parser.add_argument(
+            "--jsonl",
+            metavar="<FILE>",
+            type=FileType("w", encoding="UTF-8"),
+            help="Also write the tree in JSON Lines format, one record by line",
+        )
+        parser.add_argument(
+            "--sqlite",
+            metavar="<FILE>",
+            type=str,
+            help="Also write the tree in a SQLite database",
+        )
+        parser.add_argument(
+            "--snapshot",
+            metavar="<FILE>",
+            type=str,
+            help="Also write the tree in a binary snapshot, read back by -i",
+        )
+        parser.add_argument(
+            "--processes",
+            metavar="<INT>",
+            type=int,
+            help="Number of processes reading and writing the GEDCOM files [1]",
+        )
+        parser.add_argument(
+            "--external",
+            action="store_true",
+            default=False,
+            help="Merge with bounded memory, sorting the records in temporary files",
+        )
+        parser.add_argument(
+            "--stable-ids",
+            action="store_true",
+            default=False,
+            help="Derive the GEDCOM identifiers from FamilySearch ids and contents, "
+            "unchanged between runs",
         )
     except TypeError:
         sys.stderr.write("Python >= 3.4 is required to run this script\n")
@@ -51,74 +96,88 @@ def main():
         parser.print_help()
         exit(2)
 
+    if args.external and (
+        args.jsonl or args.sqlite or args.snapshot or args.stable_ids
+    ):
+        sys.stderr.write(
+            "--external cannot be used with --jsonl, --sqlite, --snapshot "
+            "or --stable-ids\n"
+        )
+        exit(2)
+    if args.external and any(
+        is_snapshot(getattr(file, "name", None)) for file in args.i
+    ):
+        sys.stderr.write("--external cannot read snapshot files\n")
+        exit(2)
+
+    # merge the records sorted by FamilySearch id without loading the files
+    if args.external:
+        merge = ExternalMerge()
+        for file in args.i:
+            merge.add_file(file)
+        merge.merge(args.o)
+        if args.o is not sys.stdout:
+            args.o.close()
+        return
+
     tree = Tree()
 
-    indi_counter = 0
-    fam_counter = 0
+    # read the GEDCOM data, in worker processes if possible
+    names = [getattr(file, "name", None) for file in args.i]
+    pool = None
+    if args.processes and args.processes > 1:
+        if all(
+            name and os.path.isfile(name) and not is_snapshot(name) for name in names
+        ):
+            for file in args.i:
+                file.close()
+            pool = ProcessPoolExecutor(args.processes)
+            start = time.time()
+            durations = list()
+            results = pool.map(parse_file, names)
 
-    # read the GEDCOM data
     for file in args.i:
-        ged = Gedcom(file, tree)
-
-        # add information about individuals
-        for num in ged.indi:
-            fid = ged.indi[num].fid
-            if fid not in tree.indi:
-                indi_counter += 1
-                tree.indi[fid] = Indi(tree=tree, num=indi_counter)
-                tree.indi[fid].tree = tree
-                tree.indi[fid].fid = ged.indi[num].fid
-            tree.indi[fid].fams_fid |= ged.indi[num].fams_fid
-            tree.indi[fid].famc_fid |= ged.indi[num].famc_fid
-            tree.indi[fid].name = ged.indi[num].name
-            tree.indi[fid].birthnames = ged.indi[num].birthnames
-            tree.indi[fid].nicknames = ged.indi[num].nicknames
-            tree.indi[fid].aka = ged.indi[num].aka
-            tree.indi[fid].married = ged.indi[num].married
-            tree.indi[fid].gender = ged.indi[num].gender
-            tree.indi[fid].facts = ged.indi[num].facts
-            tree.indi[fid].notes = ged.indi[num].notes
-            tree.indi[fid].sources = ged.indi[num].sources
-            tree.indi[fid].memories = ged.indi[num].memories
-            tree.indi[fid].baptism = ged.indi[num].baptism
-            tree.indi[fid].confirmation = ged.indi[num].confirmation
-            tree.indi[fid].initiatory = ged.indi[num].initiatory
-            tree.indi[fid].endowment = ged.indi[num].endowment
-            if not (tree.indi[fid].sealing_child and tree.indi[fid].sealing_child.famc):
-                tree.indi[fid].sealing_child = ged.indi[num].sealing_child
-
-        # add information about families
-        for num in ged.fam:
-            husb, wife = (ged.fam[num].husb_fid, ged.fam[num].wife_fid)
-            if (husb, wife) not in tree.fam:
-                fam_counter += 1
-                tree.fam[(husb, wife)] = Fam(husb, wife, tree, fam_counter)
-                tree.fam[(husb, wife)].tree = tree
-            tree.fam[(husb, wife)].chil_fid |= ged.fam[num].chil_fid
-            if ged.fam[num].fid:
-                tree.fam[(husb, wife)].fid = ged.fam[num].fid
-            if ged.fam[num].facts:
-                tree.fam[(husb, wife)].facts = ged.fam[num].facts
-            if ged.fam[num].notes:
-                tree.fam[(husb, wife)].notes = ged.fam[num].notes
-            if ged.fam[num].sources:
-                tree.fam[(husb, wife)].sources = ged.fam[num].sources
-            tree.fam[(husb, wife)].sealing_spouse = ged.fam[num].sealing_spouse
-
-    # merge notes by text
-    tree.notes = sorted(tree.notes, key=lambda x: x.text)
-    for i, n in enumerate(tree.notes):
-        if i == 0:
-            n.num = 1
-            continue
-        if n.text == tree.notes[i - 1].text:
-            n.num = tree.notes[i - 1].num
+        if pool:
+            ged, duration = next(results)
+            ged.attach(tree)
+            durations.append(duration)
+        elif is_snapshot(getattr(file, "name", None)):
+            ged = Snapshot(file.name, tree)
         else:
-            n.num = tree.notes[i - 1].num + 1
+            ged = Gedcom(file, tree)
+        tree.merge(ged)
+
+    if pool:
+        pool.shutdown()
+        elapsed = time.time() - start
+        sys.stderr.write(
+            "Read and merged %s files in %.1f seconds with %s processes "
+            "(%.1f seconds of parsing in the workers, x%.1f the elapsed time, "
+            "an estimate of the speedup)\n"
+            % (
+                len(names),
+                elapsed,
+                args.processes,
+                sum(durations),
+                sum(durations) / max(elapsed, 1e-6),
+            )
+        )
+
+    if args.stable_ids:
+        tree.stable_num()
 
     # compute number for family relationships and print GEDCOM file
     tree.reset_num()
-    tree.print(args.o)
+    tree.print(args.o, processes=args.processes)
+    if args.o is not sys.stdout:
+        args.o.close()
+    if args.jsonl:
+        write_jsonl(tree, args.jsonl)
+        args.jsonl.close()
+    if args.sqlite:
+        write_sqlite(tree, args.sqlite)
+    if args.snapshot:
+        write_snapshot(tree, args.snapshot)
 
 
 if __name__ == "__main__":
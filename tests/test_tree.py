@@ -0,0 +1,77 @@
+# global imports
+import sys
+import threading
+import unittest
+from collections import Counter
+
+# local imports
+from getmyancestors.classes.tree import Note, Tree
+
+# number of threads adding records at the same time
+THREADS = 16
+
+# number of records added by each thread
+COUNT = 2000
+
+# number of times the threads are run on a new tree
+ROUNDS = 5
+
+
+class TestTreeThreads(unittest.TestCase):
+    """Records added to a tree by many threads at the same time"""
+
+    def setUp(self):
+        self.interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)
+
+    def tearDown(self):
+        sys.setswitchinterval(self.interval)
+
+    def run_threads(self, target):
+        barrier = threading.Barrier(THREADS)
+
+        def run(n):
+            barrier.wait()
+            target(n)
+
+        threads = [threading.Thread(target=run, args=(n,)) for n in range(THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    def test_add_note_get_note_add_source(self):
+        for _ in range(ROUNDS):
+            self.check_records(Tree())
+
+    def check_records(self, tree):
+        results = [list() for _ in range(THREADS)]
+
+        def work(n):
+            for i in range(COUNT):
+                Note("note %s %s" % (n, i), tree)
+                results[n].append(tree.get_note("shared %s" % i))
+                tree.add_source({"id": "S%s" % (i % 20)})
+
+        self.run_threads(work)
+
+        # every Note has its own number
+        nums = [note.num for note in tree.notes]
+        self.assertEqual(len(nums), len(set(nums)))
+
+        # each shared text maps to exactly one Note, returned to every thread
+        texts = Counter(note.text for note in tree.notes)
+        self.assertEqual(len(texts), THREADS * COUNT + COUNT)
+        self.assertTrue(all(count == 1 for count in texts.values()))
+        for notes in results:
+            for note in notes:
+                self.assertIs(note, tree.note_index[note.text])
+
+        # one Source by id, each with its own number
+        self.assertEqual(len(tree.sources), 20)
+        nums = [source.num for source in tree.sources.values()]
+        self.assertEqual(len(nums), len(set(nums)))
+
+
+if __name__ == "__main__":
+    unittest.main()